@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Post, Category, Tag, Comment
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from hallaplantproject.profiling import make_token, QUERY_PARAM
+from .models import Post, Category, Tag, Comment, Job, ProfileCapture
 
 class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name', )}  # Category의 name으로 slug를 자동생성 -> admin.site.register
@@ -10,4 +16,46 @@ class TagAdmin(admin.ModelAdmin):
 admin.site.register(Post)
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Tag, TagAdmin)
-admin.site.register(Comment)
\ No newline at end of file
+admin.site.register(Comment)
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_after', 'locked_by', 'created')
+    list_filter = ('status', 'name')
+
+admin.site.register(Job, JobAdmin)
+
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'status_code', 'duration_ms', 'samples', 'user', 'stacks_link')
+    list_filter = ('method', 'status_code')
+    search_fields = ('path', )
+    readonly_fields = (
+        'path', 'method', 'user', 'status_code', 'duration_ms', 'samples', 'interval_ms', 'stacks_link', 'summary', 'created',
+    )
+    exclude = ('stacks', )
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/stacks/', self.admin_site.admin_view(self.download_stacks), name='blog_profilecapture_stacks'),
+            path('token/', self.admin_site.admin_view(self.show_token), name='blog_profilecapture_token'),
+        ] + super(ProfileCaptureAdmin, self).get_urls()
+
+    def stacks_link(self, obj):
+        return format_html('<a href="{}">folded stacks</a>', reverse('admin:blog_profilecapture_stacks', args=[obj.pk]))
+    stacks_link.short_description = 'flame graph'
+
+    def download_stacks(self, request, pk):
+        capture = get_object_or_404(ProfileCapture, pk=pk)
+        if not self.has_view_permission(request, capture) or not capture.stacks:
+            raise Http404
+        return FileResponse(capture.stacks.open('rb'), as_attachment=True, filename='profile-{}.folded'.format(capture.pk))
+
+    def show_token(self, request):
+        # 이 사용자로 로그인한 상태에서 ?profile=<token>을 붙여 요청하면 그 요청이 측정된다
+        if not request.user.is_staff:
+            raise Http404
+        return HttpResponse('?{}={}\n'.format(QUERY_PARAM, make_token(request.user)), content_type='text/plain')
+
+admin.site.register(ProfileCapture, ProfileCaptureAdmin)
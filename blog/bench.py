@@ -0,0 +1,287 @@
+"""
+blog/urls.py, main/urls.py의 모든 주소를 WSGI 앱으로 직접 요청해 응답 시간을 잰다 (manage.py bench).
+
+네트워크와 웹서버를 빼고 django 안(middleware, view, DB, template)에서 걸리는 시간만 잰다.
+결과는 JSON으로 저장해 두 번의 실행을 비교할 수 있다 (manage.py bench --compare before.json after.json).
+"""
+import io
+import platform
+import queue
+import random
+import resource
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils.http import urlencode
+
+from .models import Post, Category, Tag
+
+# 측정할 urls 모듈
+URLCONFS = ('blog.urls', 'main.urls')
+
+
+def walk_patterns(patterns, prefix='', urlconf=None):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            # include('blog.urls')는 module, admin.site.urls는 list
+            name = getattr(pattern.urlconf_name, '__name__', pattern.urlconf_name)
+            name = name if isinstance(name, str) else urlconf
+            yield from walk_patterns(pattern.url_patterns, route, name)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern, urlconf
+
+
+def url_templates():
+    """측정할 url 목록 ('/blog/<int:pk>/' 형태). 같은 urls가 여러 곳에 include되어 있으면 처음 것만"""
+    seen = set()
+    templates = []
+    for route, pattern, urlconf in walk_patterns(get_resolver().url_patterns):
+        if urlconf not in URLCONFS or (urlconf, str(pattern.pattern)) in seen:
+            continue
+        seen.add((urlconf, str(pattern.pattern)))
+        templates.append('/' + route)
+    return templates
+
+
+class Sampler:
+    """url의 <int:pk>, <str:slug> 자리에 넣을 실제 값들"""
+
+    def __init__(self, samples=20, seed=0):
+        rand = random.Random(seed)
+
+        def pick(values):
+            values = list(values)
+            return rand.sample(values, min(samples, len(values)))
+
+        self.values = {
+            'pk': pick(Post.objects.values_list('pk', flat=True)),
+            'tag': pick(Tag.objects.values_list('slug', flat=True)),
+            'category': pick(Category.objects.values_list('slug', flat=True)) + ['_none'],
+        }
+        self.query = {
+            '/blog/search/': [urlencode({'q': q}) for q in ('plant', 'jeju', '식물', 'spring garden')],
+        }
+
+    def expand(self, template):
+        """template을 실제 url 목록으로. 채울 수 없으면 빈 목록"""
+        if '<str:slug>' in template:
+            kind = 'tag' if '/tag/' in template else 'category' if '/category/' in template else None
+            values = self.values.get(kind, [])
+            urls = [template.replace('<str:slug>', str(value)) for value in values]
+        elif '<int:pk>' in template:
+            urls = [template.replace('<int:pk>', str(value)) for value in self.values['pk']]
+        elif '<' in template:
+            urls = []
+        else:
+            urls = [template]
+        queries = self.query.get(template)
+        if queries:
+            urls = ['{}?{}'.format(url, query) for url in urls for query in queries]
+        return urls
+
+
+def session_cookie(username):
+    from importlib import import_module
+
+    user = User.objects.get(username=username)
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store[SESSION_KEY] = str(user.pk)
+    store[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.save()
+    return '{}={}'.format(settings.SESSION_COOKIE_NAME, store.session_key)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux는 KB, macOS는 bytes
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+class Runner:
+    def __init__(self, concurrency=4, accept_encoding='gzip', cookie=None):
+        self.concurrency = concurrency
+        self.app = WSGIHandler()
+        self.headers = {'HTTP_ACCEPT_ENCODING': accept_encoding}
+        if cookie:
+            self.headers['HTTP_COOKIE'] = cookie
+
+    def environ(self, url):
+        path, _, query = url.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': '127.0.0.1',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': '127.0.0.1',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': self.concurrency > 1,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        environ.update(self.headers)
+        return environ
+
+    def request(self, url):
+        """(status, 걸린 시간(초), 응답 크기, SQL 수)"""
+        status = []
+        queries = [0]
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            started = time.perf_counter()
+            result = self.app(self.environ(url), start_response)
+            try:
+                size = sum(len(chunk) for chunk in result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            elapsed = time.perf_counter() - started
+        return status[0], elapsed, size, queries[0]
+
+    def worker(self, jobs, results):
+        try:
+            while True:
+                try:
+                    template, url = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                results.append((template,) + self.request(url))
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    def run(self, work):
+        jobs = queue.Queue()
+        for item in work:
+            jobs.put(item)
+        results = []
+        started = time.perf_counter()
+        if self.concurrency <= 1:
+            self.worker(jobs, results)
+        else:
+            threads = [threading.Thread(target=self.worker, args=(jobs, results)) for _ in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return results, time.perf_counter() - started
+
+
+def summarize(rows, elapsed):
+    latencies = [row[2] for row in rows]
+    statuses = {}
+    for row in rows:
+        statuses[str(row[1])] = statuses.get(str(row[1]), 0) + 1
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(rows),
+        'status': statuses,
+        'errors': sum(1 for row in rows if row[1] >= 500),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else None,
+        'queries_mean': round(sum(row[4] for row in rows) / len(rows), 2) if rows else None,
+        'queries_max': max((row[4] for row in rows), default=None),
+        'bytes_mean': int(sum(row[3] for row in rows) / len(rows)) if rows else None,
+    }
+
+
+def benchmark(concurrency=4, requests=50, warmup=1, samples=20, seed=0, username=None, accept_encoding='gzip'):
+    """url template마다 requests번씩 요청하고 결과 dict를 반환한다"""
+    sampler = Sampler(samples=samples, seed=seed)
+    runner = Runner(
+        concurrency=concurrency,
+        accept_encoding=accept_encoding,
+        cookie=session_cookie(username) if username else None,
+    )
+
+    rand = random.Random(seed)
+    work, skipped = [], []
+    for template in url_templates():
+        urls = sampler.expand(template)
+        if not urls:
+            skipped.append(template)
+            continue
+        # 캐시가 데워진 상태에서 잰다
+        for _ in range(warmup):
+            for url in urls:
+                runner.request(url)
+        work.extend((template, urls[i % len(urls)]) for i in range(requests))
+    rand.shuffle(work)
+
+    rows, elapsed = runner.run(work)
+    by_url = {}
+    for row in rows:
+        by_url.setdefault(row[0], []).append(row)
+
+    return {
+        'config': {
+            'concurrency': concurrency,
+            'requests_per_url': requests,
+            'warmup': warmup,
+            'samples': samples,
+            'seed': seed,
+            'username': username,
+            'accept_encoding': accept_encoding,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections['default'].vendor,
+            'posts': Post.objects.count(),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'total': summarize(rows, elapsed),
+        'urls': {template: summarize(group, elapsed) for template, group in sorted(by_url.items())},
+        'skipped': skipped,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def compare(before, after, keys=('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_mean')):
+    """두 결과의 url별 변화 [(url, key, 이전, 이후, 변화율 %)]"""
+    rows = []
+    names = ['(total)'] + sorted(set(before['urls']) | set(after['urls']))
+    for name in names:
+        old = before['total'] if name == '(total)' else before['urls'].get(name, {})
+        new = after['total'] if name == '(total)' else after['urls'].get(name, {})
+        for key in keys:
+            a, b = old.get(key), new.get(key)
+            change = round((b - a) / a * 100, 1) if a and b is not None else None
+            rows.append((name, key, a, b, change))
+    return rows
@@ -0,0 +1,68 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .invalidation import last_changed
+from .purge import surrogate_key_header
+
+
+class ConditionalGetMixin:
+    """
+    get_cache_dependencies()의 key들이 마지막으로 바뀐 시각으로 ETag/Last-Modified를 만든다.
+    클라이언트의 값과 같으면 view를 실행하지 않고 304를 돌려준다 (ChangeMarker 조회 한번).
+    Last-Modified는 초 단위라 같은 초 안의 변경을 구분하지 못하지만, 브라우저는 If-None-Match를 같이 보내고
+    그쪽이 우선하므로 ETag(마이크로초 단위 변경 시각으로 만듦)로 정확하게 판단된다.
+
+    페이지는 모든 사용자에게 같으므로 (사용자별 부분은 /blog/me/) 공유 캐시(CDN, proxy)에 저장해도 된다는
+    Cache-Control을 붙인다. 브라우저는 BLOG_HTTP_MAX_AGE, 공유 캐시는 BLOG_HTTP_SHARED_MAX_AGE 동안 다시 묻지 않는다.
+    공유 캐시가 내용이 바뀐 페이지만 지울 수 있도록 의존하는 key들을 Surrogate-Key 헤더로 알려준다 (blog/purge.py).
+    """
+
+    def get_cache_dependencies(self):
+        return []
+
+    def get_validators(self, request):
+        changed = last_changed(self.get_cache_dependencies())
+        if changed is None:
+            return None, None
+        # request.user를 읽지 않는다 (session을 읽으면 Vary: Cookie가 붙어 공유 캐시에 저장되지 않음)
+        raw = '|'.join([request.get_full_path(), changed.isoformat()])
+        etag = quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+        return etag, timegm(changed.utctimetuple())
+
+    def add_cache_headers(self, response):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, 'BLOG_HTTP_MAX_AGE', 0),
+            s_maxage=getattr(settings, 'BLOG_HTTP_SHARED_MAX_AGE', 60),
+        )
+        keys = self.get_cache_dependencies()
+        if keys:
+            response[getattr(settings, 'BLOG_SURROGATE_KEY_HEADER', 'Surrogate-Key')] = surrogate_key_header(keys)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            response = super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+            if response.status_code == 200:
+                self.add_cache_headers(response)
+            return response
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            self.add_cache_headers(response)
+            return response
+
+        response = super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            self.add_cache_headers(response)
+        return response
@@ -0,0 +1,75 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+# (format, 확장자, mime type). webp를 지원하지 않는 Pillow에서는 jpeg만 만든다
+FORMATS = [
+    ('WEBP', 'webp', 'image/webp'),
+    ('JPEG', 'jpg', 'image/jpeg'),
+]
+
+
+def derivative_widths():
+    return getattr(settings, 'BLOG_IMAGE_WIDTHS', (400, 750, 1200))
+
+
+def available_formats():
+    return [f for f in FORMATS if f[0] != 'WEBP' or features.check('webp')]
+
+
+def derivative_name(name, width, ext):
+    # blog/2020/08/01/photo.jpg -> blog/2020/08/01/photo.750w.webp (원본 옆에 저장)
+    root, _ = os.path.splitext(name)
+    return '{}.{}w.{}'.format(root, width, ext)
+
+
+def generate_derivatives(field_file):
+    """
+    원본 이미지에서 너비별 webp/jpeg 파일을 만들고 만든 너비 목록을 반환한다.
+    EXIF 방향은 적용한 뒤 메타데이터 없이 다시 인코딩한다.
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as f:
+        original = Image.open(f)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+
+    widths = [w for w in derivative_widths() if w <= original.width] or [original.width]
+    quality = getattr(settings, 'BLOG_IMAGE_QUALITY', 80)
+
+    for width in widths:
+        resized = original.copy()
+        resized.thumbnail((width, original.height), Image.LANCZOS)
+        for fmt, ext, _ in available_formats():
+            image = resized
+            if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGBA')
+            buffer = BytesIO()
+            image.save(buffer, fmt, quality=quality, optimize=True)
+
+            name = derivative_name(field_file.name, width, ext)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    return widths
+
+
+def delete_derivatives(storage, name, widths):
+    for width in widths:
+        for _, ext, _ in FORMATS:
+            derived = derivative_name(name, width, ext)
+            if storage.exists(derived):
+                storage.delete(derived)
+
+
+def srcset(field_file, widths, ext):
+    storage = field_file.storage
+    return ', '.join(
+        '{} {}w'.format(storage.url(derivative_name(field_file.name, width, ext)), width)
+        for width in widths
+    )
@@ -0,0 +1,91 @@
+"""
+페이지가 의존하는 객체를 이름(key)으로 나타낸다.
+
+    posts           전체 게시물 목록 (/blog/, 메인 페이지)
+    post:<pk>       게시물 상세 페이지
+    tag:<slug>      태그별 목록
+    category:<slug> 카테고리별 목록 (미분류는 category:_none)
+    sidebar         모든 블로그 페이지의 카테고리 목록
+
+signals에서 바뀐 객체에 해당하는 key들로 touch()를 호출하면 그 key에 의존하는 캐시가 무효화되고
+key별 변경 시각(ChangeMarker)이 갱신된다. 앞단 HTTP 캐시에도 같은 key로 purge를 보낸다 (blog/purge.py).
+"""
+from django.db.models import Max
+from django.utils import timezone
+
+from .pagecache import bump_versions
+from .purge import queue_purge
+
+POSTS = 'posts'
+SIDEBAR = 'sidebar'
+UNCATEGORIZED_SLUG = '_none'
+
+
+def post_key(pk):
+    return 'post:{}'.format(pk)
+
+
+def tag_key(slug):
+    return 'tag:{}'.format(slug)
+
+
+def category_key(slug):
+    return 'category:{}'.format(slug or UNCATEGORIZED_SLUG)
+
+
+def keys_for_category_ids(category_ids):
+    from .models import Category
+
+    category_ids = set(category_ids)
+    keys = {category_key(slug) for slug in Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True)}
+    if None in category_ids:
+        keys.add(category_key(None))
+    return keys
+
+
+def keys_for_posts(post_ids):
+    """게시물 카드가 보이는 모든 페이지 (상세, 전체 목록, 해당 카테고리/태그 목록)"""
+    from .models import Post, Tag
+
+    post_ids = set(post_ids)
+    if not post_ids:
+        return set()
+    keys = {POSTS}
+    keys.update(post_key(pk) for pk in post_ids)
+    keys.update(keys_for_category_ids(
+        Post.objects.filter(pk__in=post_ids).values_list('category_id', flat=True)
+    ))
+    keys.update(tag_key(slug) for slug in Tag.objects.filter(post__in=post_ids).values_list('slug', flat=True))
+    return keys
+
+
+def mark_changed(keys, when=None):
+    from .models import ChangeMarker
+
+    when = when or timezone.now()
+    keys = sorted(set(keys))
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        existing = set(ChangeMarker.objects.filter(key__in=chunk).values_list('key', flat=True))
+        ChangeMarker.objects.filter(key__in=existing).update(changed=when)
+        ChangeMarker.objects.bulk_create(
+            [ChangeMarker(key=key, changed=when) for key in chunk if key not in existing],
+            ignore_conflicts=True,
+        )
+
+
+def last_changed(keys):
+    from .models import ChangeMarker
+
+    return ChangeMarker.objects.filter(key__in=list(keys)).aggregate(changed=Max('changed'))['changed']
+
+
+def touch(keys):
+    keys = set(keys)
+    if not keys:
+        return
+    # 변경 시각은 같은 트랜잭션에서 기록하고, 캐시 버전은 커밋 후에도 한번 더 바꾼다
+    mark_changed(keys)
+    bump_versions(keys)
+    # purge 작업도 같은 트랜잭션에 저장되므로 커밋된 뒤에 보내진다
+    queue_purge(keys)
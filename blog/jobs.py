@@ -0,0 +1,142 @@
+"""
+DB(blog_job 테이블)를 큐로 쓰는 작은 작업 처리기. 브로커 없이 sqlite 하나로 동작한다.
+
+    @job('search.sync_posts')
+    def sync_posts(post_ids): ...
+
+    enqueue('search.sync_posts', {'post_ids': [1]}, key='search:post:1')
+
+작업은 요청과 같은 트랜잭션에서 저장되므로 커밋된 변경에 대해서만 실행된다.
+manage.py run_jobs 가 대기중인 작업을 가져가 실행하고, 실패하면 점점 늦춰가며 다시 시도한다.
+settings.BLOG_JOBS_EAGER = True 이면 enqueue 할 때 바로 실행한다.
+"""
+import json
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def job(name):
+    def register(func):
+        _registry[name] = func
+        return func
+    return register
+
+
+def is_eager():
+    return getattr(settings, 'BLOG_JOBS_EAGER', False)
+
+
+def enqueue(name, payload=None, key='', delay=0, max_attempts=None):
+    if name not in _registry:
+        raise KeyError('unknown job: {}'.format(name))
+    payload = payload or {}
+    if is_eager():
+        _registry[name](**payload)
+        return None
+
+    if key:
+        pending = Job.objects.filter(key=key, status=Job.PENDING).first()
+        if pending is not None:
+            return pending
+    return Job.objects.create(
+        name=name,
+        payload=json.dumps(payload),
+        key=key,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'BLOG_JOBS_MAX_ATTEMPTS', 5),
+    )
+
+
+def default_worker_id():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'BLOG_JOBS_RETRY_DELAY', 10)
+    return min(base * 2 ** (attempts - 1), 60 * 60)
+
+
+def claim(worker_id):
+    """실행할 작업 하나를 가져온다. 다른 worker가 먼저 가져간 작업은 건너뛴다."""
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status=Job.PENDING, run_after__lte=now)
+        .order_by('run_after', 'pk')
+        .values_list('pk', flat=True)[:10]
+    )
+    for pk in list(candidates):
+        claimed = Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run(job_obj):
+    try:
+        _registry[job_obj.name](**json.loads(job_obj.payload))
+    except Exception:
+        job_obj.last_error = traceback.format_exc()
+        if job_obj.attempts >= job_obj.max_attempts:
+            job_obj.status = Job.FAILED
+            logger.error('job %s failed permanently', job_obj)
+        else:
+            job_obj.status = Job.PENDING
+            job_obj.run_after = timezone.now() + timedelta(seconds=retry_delay(job_obj.attempts))
+            logger.warning('job %s failed, retrying at %s', job_obj, job_obj.run_after)
+        job_obj.locked_by = ''
+        job_obj.locked_at = None
+        job_obj.save(update_fields=['status', 'run_after', 'last_error', 'locked_by', 'locked_at'])
+        return False
+    job_obj.delete()
+    return True
+
+
+WORKER_LOST = 'worker lost'
+
+
+def requeue_stale(timeout):
+    """
+    worker가 죽어서 RUNNING 상태로 남은 작업을 되돌리고 되돌린 개수를 반환한다.
+    이미 max_attempts번 시도한 작업은 (worker를 죽이는 작업일 수 있으므로) 다시 돌리지 않고 FAILED로 둔다.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, last_error=WORKER_LOST, locked_by='', locked_at=None,
+    )
+    if failed:
+        logger.error('%d jobs failed permanently: %s', failed, WORKER_LOST)
+    return stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.PENDING, last_error=WORKER_LOST, locked_by='', locked_at=None, run_after=now,
+    )
+
+
+def run_pending(worker_id=None, limit=None):
+    """지금 실행할 수 있는 작업을 모두(또는 limit개) 실행하고 실행한 개수를 반환한다."""
+    worker_id = worker_id or default_worker_id()
+    count = 0
+    while limit is None or count < limit:
+        job_obj = claim(worker_id)
+        if job_obj is None:
+            break
+        run(job_obj)
+        count += 1
+    return count
@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import bench
+
+
+class Command(BaseCommand):
+    help = 'blog, main의 모든 url을 WSGI 앱으로 요청해 지연시간(p50/p95/p99), 처리량, SQL 수, 메모리를 잰다'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='동시에 요청하는 thread 수')
+        parser.add_argument('--requests', type=int, default=50, help='url마다 요청할 횟수')
+        parser.add_argument('--warmup', type=int, default=1, help='측정 전에 각 url을 몇 번씩 요청할지')
+        parser.add_argument('--samples', type=int, default=20, help='<pk>, <slug> 자리에 넣을 값의 수')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--username', help='이 사용자로 로그인한 상태로 요청')
+        parser.add_argument('--accept-encoding', default='gzip')
+        parser.add_argument('--output', help='결과를 저장할 JSON 파일')
+        parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='저장해 둔 두 결과를 비교한다')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.compare(*options['compare'])
+
+        result = bench.benchmark(
+            concurrency=options['concurrency'],
+            requests=options['requests'],
+            warmup=options['warmup'],
+            samples=options['samples'],
+            seed=options['seed'],
+            username=options['username'],
+            accept_encoding=options['accept_encoding'],
+        )
+
+        row = '{:<32} {:>6} {:>9} {:>9} {:>9} {:>9} {:>8}'
+        self.stdout.write(row.format('url', 'reqs', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries'))
+        for name, summary in list(result['urls'].items()) + [('(total)', result['total'])]:
+            self.stdout.write(row.format(name, *[str(summary[key]) for key in (
+                'requests', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_mean',
+            )]))
+        for name in result['skipped']:
+            self.stderr.write('skipped {} (값을 채울 수 없음)'.format(name))
+        self.stdout.write('peak RSS {} KB, {} posts'.format(result['peak_rss_kb'], result['environment']['posts']))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS('saved to {}'.format(options['output'])))
+
+    def compare(self, before_path, after_path):
+        try:
+            with open(before_path) as f:
+                before = json.load(f)
+            with open(after_path) as f:
+                after = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        row = '{:<32} {:<15} {:>10} {:>10} {:>8}'
+        self.stdout.write(row.format('url', 'metric', 'before', 'after', 'change'))
+        for name, key, a, b, change in bench.compare(before, after):
+            self.stdout.write(row.format(name, key, str(a), str(b), '' if change is None else '{:+.1f}%'.format(change)))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from blog import images
+from blog.invalidation import keys_for_posts, touch
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = '기존 게시물의 head_image로 크기별 webp/jpeg 이미지를 만든다'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='이미 만들어진 게시물도 다시 만든다')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(head_image='').only('pk', 'head_image', 'head_image_widths')
+        if not options['force']:
+            posts = posts.filter(head_image_widths='')
+
+        done = []
+        for post in posts.iterator():
+            try:
+                widths = images.generate_derivatives(post.head_image)
+            except (OSError, ValueError) as e:
+                self.stderr.write('post {}: {}'.format(post.pk, e))
+                continue
+            Post.objects.filter(pk=post.pk).update(head_image_widths=','.join(str(w) for w in widths))
+            done.append(post.pk)
+        # 이미지 태그가 바뀌므로 이 게시물들이 보이는 페이지를 무효화한다 (tasks.make_head_image_derivatives와 같음)
+        for start in range(0, len(done), 500):
+            touch(keys_for_posts(done[start:start + 500]))
+        self.stdout.write(self.style.SUCCESS('{} posts processed'.format(len(done))))
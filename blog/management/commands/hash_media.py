@@ -0,0 +1,97 @@
+import re
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog import images
+from blog.invalidation import keys_for_posts, touch
+from blog.models import Post, Comment
+from hallaplantproject.storage import is_content_addressed, is_derivative
+
+
+class Command(BaseCommand):
+    help = (
+        '예전 이름으로 저장된 업로드 파일을 내용 hash 이름(ContentAddressedStorage)으로 옮기고 '
+        'head_image 경로와 게시물/댓글 markdown의 이미지 링크를 바꾼다. 예전 파일은 지우지 않는다'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='바꿀 항목만 출력한다')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.storage = Post._meta.get_field('head_image').storage
+        self.renamed = {} # 예전 이름 -> hash 이름
+
+        head_images = self.migrate_head_images()
+        link_pattern = re.compile(re.escape(settings.MEDIA_URL) + r'''([^\s)"'<>]+)''')
+        posts = self.rewrite_links(Post.objects.all(), 'content', link_pattern)
+        comments = self.rewrite_links(Comment.objects.only('pk', 'post_id', 'text'), 'text', link_pattern)
+
+        self.stdout.write(self.style.SUCCESS('{}{} files, {} head images, {} posts, {} comments'.format(
+            '(dry run) ' if self.dry_run else '', len(self.renamed), head_images, posts, comments,
+        )))
+
+    def hashed_name(self, name):
+        """hash 이름으로 저장하고 그 이름을 반환한다. 옮길 수 없으면 None"""
+        if name in self.renamed:
+            return self.renamed[name]
+        if is_content_addressed(name) or is_derivative(name) or not self.storage.exists(name):
+            return None
+        if self.dry_run:
+            new_name = name
+        else:
+            with self.storage.open(name, 'rb') as f:
+                new_name = self.storage.save(name, File(f, name))
+        self.stdout.write('{} -> {}'.format(name, new_name))
+        self.renamed[name] = new_name
+        return new_name
+
+    def migrate_head_images(self):
+        count = 0
+        posts = Post.objects.exclude(head_image='').only('pk', 'head_image', 'head_image_widths')
+        for post in posts.iterator():
+            name = post.head_image.name
+            new_name = self.hashed_name(name)
+            if new_name is None:
+                if not is_content_addressed(name):
+                    self.stderr.write('post {}: {} not found'.format(post.pk, name))
+                continue
+            count += 1
+            if self.dry_run:
+                continue
+            # 만들어 둔 크기별 이미지도 새 이름으로 복사한다
+            for width in post.get_head_image_widths():
+                for _, ext, _ in images.FORMATS:
+                    old = images.derivative_name(name, width, ext)
+                    new = images.derivative_name(new_name, width, ext)
+                    if self.storage.exists(old) and not self.storage.exists(new):
+                        with self.storage.open(old, 'rb') as f:
+                            self.storage.save(new, File(f, new))
+            with transaction.atomic():
+                Post.objects.filter(pk=post.pk, head_image=name).update(head_image=new_name)
+                touch(keys_for_posts([post.pk]))
+        return count
+
+    def rewrite_links(self, queryset, field, pattern):
+        def replace(match):
+            new_name = self.hashed_name(unquote(match.group(1)))
+            if new_name is None:
+                return match.group(0)
+            return self.storage.url(new_name)
+
+        count = 0
+        for obj in queryset.iterator():
+            text = getattr(obj, field)
+            rewritten = pattern.sub(replace, text)
+            if rewritten == text:
+                continue
+            count += 1
+            if not self.dry_run:
+                setattr(obj, field, rewritten)
+                # 다시 렌더링되고 캐시도 signals에서 무효화된다
+                obj.save(update_fields=[field])
+        return count
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.http import urlencode
+
+from hallaplantproject.profiling import make_token, QUERY_PARAM
+
+
+class Command(BaseCommand):
+    help = 'staff 사용자가 요청 하나를 profiler로 잴 수 있는 주소를 만든다 (그 사용자로 로그인한 상태에서 열 것)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path', help='ex. /blog/123/')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('no such user: {}'.format(options['username']))
+        if not user.is_staff:
+            raise CommandError('{} is not staff'.format(user.username))
+
+        path = options['path']
+        separator = '&' if '?' in path else '?'
+        self.stdout.write(path + separator + urlencode({QUERY_PARAM: make_token(user)}))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog import related
+from blog.invalidation import post_key, touch
+
+
+class Command(BaseCommand):
+    help = '모든 게시물의 관련 게시물(RelatedPost)을 처음부터 다시 계산한다'
+
+    def handle(self, *args, **options):
+        changed = related.rebuild()
+        # 목록이 바뀐 상세 페이지를 무효화한다
+        touch({post_key(pk) for pk in changed})
+        self.stdout.write(self.style.SUCCESS('{} posts changed'.format(len(changed))))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = '게시물 검색 색인(FTS5)을 처음부터 다시 만든다'
+
+    def handle(self, *args, **options):
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('{} posts indexed'.format(count)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.invalidation import keys_for_posts, touch
+from blog.signals import recount_comments
+
+
+class Command(BaseCommand):
+    help = '게시물의 댓글 수, 마지막 댓글 시각(comment_count, last_comment_at)을 실제 댓글과 맞춘다'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int, help='이 게시물들만 확인한다 (기본: 전체)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount_comments(options['post_ids'] or None)
+            # 고친 게시물이 보이는 페이지를 무효화한다
+            touch(keys_for_posts(fixed))
+        for pk in fixed:
+            self.stdout.write('post {} fixed'.format(pk))
+        self.stdout.write(self.style.SUCCESS('{} posts fixed'.format(len(fixed))))
@@ -0,0 +1,38 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import jobs
+
+
+class Command(BaseCommand):
+    help = '작업 큐(blog_job)의 대기중인 작업을 실행하는 worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='지금 대기중인 작업만 실행하고 끝낸다')
+        parser.add_argument('--sleep', type=float, default=1.0, help='할 일이 없을 때 기다리는 시간(초)')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='이 시간(초) 넘게 running인 작업은 worker가 죽은 것으로 보고 다시 대기시킨다 (max_attempts번 시도했으면 failed)')
+        parser.add_argument('--worker-id', default=None)
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or jobs.default_worker_id()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping:
+            jobs.requeue_stale(options['stale_after'])
+            job_obj = jobs.claim(worker_id)
+            if job_obj is not None:
+                ok = jobs.run(job_obj)
+                self.stdout.write('{} {}'.format('done' if ok else 'failed', job_obj))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+    def stop(self, signum, frame):
+        # 실행중인 작업은 끝내고 멈춘다
+        self.stopping = True
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from blog import seed
+
+
+class Command(BaseCommand):
+    help = '벤치마크용 사용자/카테고리/태그/게시물/댓글을 만든다 (같은 --seed면 같은 데이터)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--tags', type=int, default=40)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=float, default=5, help='게시물당 평균 댓글 수')
+        parser.add_argument('--uncategorized', type=float, default=0.1, help='미분류 게시물 비율')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        counts = seed.seed(
+            users=options['users'],
+            categories=options['categories'],
+            tags=options['tags'],
+            posts=options['posts'],
+            comments=options['comments'],
+            uncategorized=options['uncategorized'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join('{} {}'.format(count, name) for name, count in counts.items()) + ' created'
+        ))
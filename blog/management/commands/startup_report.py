@@ -0,0 +1,67 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# python -X importtime: "import time:  self [us] | cumulative | imported package"
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_times(lines):
+    """최상위 package별 (누적 import 시간(초), 모듈 수). 다른 모듈 안에서 import된 것은 그 package에 들어간다"""
+    packages = defaultdict(lambda: [0.0, 0])
+    nested = 0
+    for line in lines:
+        match = IMPORT_TIME_RE.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, module = match.groups()
+        nested += 1
+        if len(indent) <= 1:
+            # 안에서 import된 모듈이 먼저 나오고 들여쓰기 없는 줄이 그것들을 모두 포함한다
+            root = packages[module.split('.')[0]]
+            root[0] += int(cumulative) / 1e6
+            root[1] += nested
+            nested = 0
+    return packages
+
+
+class Command(BaseCommand):
+    help = (
+        '새 프로세스를 띄워 worker 시작 시간을 잰다: package별 import 시간, django.setup(), '
+        'WSGI handler, warm-up 단계별 시간 (hallaplantproject/warmup.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='import 시간이 긴 package 몇 개를 보여줄지')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'hallaplantproject.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'hallaplantproject.warmup'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError('startup failed:\n' + result.stderr[-2000:])
+        phases = json.loads(result.stdout)
+        packages = import_times(result.stderr.splitlines())
+
+        total_import = sum(seconds for seconds, _ in packages.values())
+        self.stdout.write('imports ({} modules, {:.1f}ms)'.format(
+            sum(count for _, count in packages.values()), total_import * 1000,
+        ))
+        ranked = sorted(packages.items(), key=lambda item: item[1][0], reverse=True)
+        for package, (seconds, count) in ranked[:options['top']]:
+            self.stdout.write('  {:<28} {:>9.1f}ms {:>5} modules'.format(package, seconds * 1000, count))
+
+        # django.setup()에는 앱 import가 들어 있으므로 위의 import 시간과 겹친다
+        self.stdout.write('startup')
+        for name, seconds, count in phases:
+            self.stdout.write('  {:<28} {:>9.1f}ms{}'.format(name, seconds * 1000, '' if count is None else ' {:>5}'.format(count)))
+        warm_up = sum(seconds for name, seconds, _ in phases if name.startswith('warm-up '))
+        self.stdout.write(self.style.SUCCESS('warm-up {:.1f}ms (첫 요청에서 빠지는 시간)'.format(warm_up * 1000)))
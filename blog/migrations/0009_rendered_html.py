@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # 처음에는 날짜가 다른 자동 이름으로 만들어졌다. 이미 적용한 DB는 적용된 것으로 본다
+    replaces = [('blog', '0009_auto_20261019_0003')]
+
+    dependencies = [
+        ('blog', '0008_auto_20200827_0740'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_html_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:06
+
+from django.db import migrations, models
+
+
+def count_posts(apps, schema_editor):
+    Category = apps.get_model('blog', 'Category')
+    Counter = apps.get_model('blog', 'Counter')
+    Post = apps.get_model('blog', 'Post')
+
+    for category in Category.objects.all():
+        category.post_count = Post.objects.filter(category=category).count()
+        category.save(update_fields=['post_count'])
+    Counter.objects.update_or_create(
+        name='posts_without_category',
+        defaults={'value': Post.objects.filter(category=None).count()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    # 처음에는 날짜가 다른 자동 이름으로 만들어졌다. 이미 적용한 DB는 적용된 것으로 본다
+    replaces = [('blog', '0010_auto_20261019_0006')]
+
+    dependencies = [
+        ('blog', '0009_rendered_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 가상 테이블은 sqlite에서만 만든다 (다른 DB에서는 검색이 비활성화됨)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts "
+        "USING fts5(title, content, tags, comments, tokenize='unicode61')"
+    )
+
+    Post = apps.get_model('blog', 'Post')
+    for post in Post.objects.prefetch_related('tags'):
+        schema_editor.execute(
+            'INSERT INTO blog_post_fts(rowid, title, content, tags, comments) VALUES (%s, %s, %s, %s, %s)',
+            [post.pk, post.title, post.content, ' '.join(tag.name for tag in post.tags.all()), ''],
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS blog_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_category_post_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
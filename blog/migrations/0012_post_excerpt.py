@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:08
+
+from django.db import migrations, models
+
+
+def expire_rendered_content(apps, schema_editor):
+    # excerpt가 없는 기존 게시물은 다음에 접근할 때 다시 렌더링되도록 한다
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.update(content_html_version=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_post_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(expire_rendered_content, migrations.RunPython.noop),
+    ]
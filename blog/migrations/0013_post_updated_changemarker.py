@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:10
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created(apps, schema_editor):
+    # 기존 게시물은 수정 시각을 알 수 없으므로 작성 시각으로 채운다
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.update(updated=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeMarker',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('changed', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_created, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_post_updated_changemarker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='head_image_widths',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created', '-id'], name='blog_post_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', '-created', '-id'], name='blog_post_category_created'),
+        ),
+        # 태그 목록: tag_id로 찾은 post_id를 테이블을 읽지 않고 인덱스만으로 얻는다 (기본 unique 인덱스는 post_id가 앞)
+        migrations.RunSQL(
+            'CREATE INDEX blog_post_tags_tag_post ON blog_post_tags (tag_id, post_id)',
+            'DROP INDEX blog_post_tags_tag_post',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import hallaplantproject.profiling
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0016_post_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCapture',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.PositiveIntegerField()),
+                ('samples', models.PositiveIntegerField()),
+                ('interval_ms', models.FloatField()),
+                ('summary', models.TextField(blank=True)),
+                ('stacks', models.FileField(storage=hallaplantproject.profiling.ProfileStorage(), upload_to='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
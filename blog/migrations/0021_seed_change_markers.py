@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:40
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def seed_change_markers(apps, schema_editor):
+    # 아직 touch된 적 없는 key에도 변경 시각을 둔다 (없으면 ETag/Last-Modified가 붙지 않음)
+    # key 형식은 blog/invalidation.py와 같다. 언제 바뀌었는지 알 수 없으므로 지금으로 한다
+    Post = apps.get_model('blog', 'Post')
+    Tag = apps.get_model('blog', 'Tag')
+    Category = apps.get_model('blog', 'Category')
+    ChangeMarker = apps.get_model('blog', 'ChangeMarker')
+
+    keys = {'posts', 'sidebar', 'category:_none'}
+    keys.update('post:{}'.format(pk) for pk in Post.objects.values_list('pk', flat=True))
+    keys.update('tag:{}'.format(slug) for slug in Tag.objects.values_list('slug', flat=True))
+    keys.update('category:{}'.format(slug) for slug in Category.objects.values_list('slug', flat=True))
+    existing = set(ChangeMarker.objects.values_list('key', flat=True))
+    now = timezone.now()
+    ChangeMarker.objects.bulk_create(
+        [ChangeMarker(key=key, changed=now) for key in sorted(keys - existing)],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_relatedpost'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_change_markers, migrations.RunPython.noop),
+    ]
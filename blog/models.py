@@ -1,13 +1,29 @@
-from django.db import models
+import html
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 from django.contrib.auth.models import User
 from markdownx.models import MarkdownxField
 from markdownx.utils import markdown
 
+from hallaplantproject.metrics import timed
+from hallaplantproject.profiling import ProfileStorage
+
+
+def markdown_render_version():
+    # markdown 확장/옵션을 바꾸면 settings의 버전을 올린다 -> 저장된 HTML이 접근할 때 다시 렌더링됨
+    return getattr(settings, 'BLOG_MARKDOWN_RENDER_VERSION', 1)
+
+
 class Category(models.Model):
     name = models.CharField(max_length=25, unique=True)
     description = models.TextField(blank=True)
 
     slug = models.SlugField(unique=True, allow_unicode=True) # 다양한 문자들을 유니코드로 변환가능
+    post_count = models.PositiveIntegerField(default=0, editable=False) # signals에서 관리 (sidebar용)
 
     def __str__(self):
         return self.name
@@ -18,6 +34,16 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = 'categories'
 
+class Counter(models.Model):
+    # 특정 모델에 붙일 수 없는 집계값 (ex. 미분류 게시물 수)
+    POSTS_WITHOUT_CATEGORY = 'posts_without_category'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '{} = {}'.format(self.name, self.value)
+
 class Tag(models.Model):
     name = models.CharField(max_length=40, unique=True)
     slug = models.SlugField(unique=True, allow_unicode=True)
@@ -30,27 +56,108 @@ class Tag(models.Model):
 
 
 
+class ChangeMarker(models.Model):
+    # blog/invalidation.py 의 key (posts, post:<pk>, tag:<slug> ...) 가 마지막으로 바뀐 시각
+    # Last-Modified / ETag 계산에 사용
+    key = models.CharField(max_length=100, unique=True)
+    changed = models.DateTimeField()
+
+    def __str__(self):
+        return '{} @ {}'.format(self.key, self.changed)
+
+
+
 class Post(models.Model):
     title = models.CharField(max_length=30)
     content = MarkdownxField()
     head_image = models.ImageField(upload_to='blog/%Y/%m/%d/', blank=True)
+    # head_image 옆에 만들어둔 크기별 이미지의 너비 목록 (ex. '400,750,1200'), blog/images.py 참고
+    head_image_widths = models.CharField(max_length=100, blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, blank=True, null=True, on_delete=models.SET_NULL)
     tags = models.ManyToManyField(Tag, blank=True)
 
+    # content를 렌더링한 HTML (저장할 때 채워짐)
+    content_html = models.TextField(blank=True, editable=False)
+    content_html_version = models.PositiveIntegerField(default=0, editable=False)
+    # 목록 카드에 보여줄 앞부분 (태그를 제거한 텍스트, content_html과 같이 만들어짐)
+    excerpt = models.TextField(blank=True, editable=False)
+    # 댓글 통계. 댓글을 쓰거나 지울 때 signals에서 같은 트랜잭션으로 갱신한다 (어긋나면 manage.py reconcile_comment_stats)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_comment_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        # 목록은 기본적으로 created, pk 역순 (blog/pagination.py keyset_ordering)
+        # 태그 목록용 (tag_id, post_id) 인덱스는 자동 생성 테이블이라 migration 0016에서 직접 만든다
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='blog_post_created_id'),
+            models.Index(fields=['category', '-created', '-id'], name='blog_post_category_created'),
+            # ?sort=discussed, ?sort=active 목록 (views.PostSortMixin)
+            models.Index(fields=['-comment_count', '-id'], name='blog_post_comment_count'),
+            models.Index(fields=['-last_comment_at', '-id'], name='blog_post_last_comment'),
+        ]
+
     def __str__(self):
         return str(self.title) + ' :: ' + str(self.author)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Post, cls).from_db(db, field_names, values)
+        # 카테고리 변경 시 카운터를 옮기기 위해 불러온 시점의 category를 기억한다
+        if 'category_id' in instance.__dict__:
+            instance._loaded_category_id = instance.category_id
+        if 'head_image' in instance.__dict__:
+            instance._loaded_head_image = instance.head_image.name or ''
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'content_html', 'content_html_version', 'excerpt'}
+        # post_save에서 갱신하는 카운터도 같은 트랜잭션에 묶는다
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Post, instance=self)):
+            super(Post, self).save(*args, **kwargs)
+
     def get_absolute_url(self):
         return '/blog/{}/'.format(self.pk)
 
+    def render_content(self):
+        self.content_html = markdown(self.content)
+        self.content_html_version = markdown_render_version()
+        # 태그를 잘라먹지 않도록 텍스트만 남긴 뒤 단어 수로 자른다 (template에서 escape됨)
+        text = ' '.join(html.unescape(strip_tags(self.content_html)).split())
+        self.excerpt = Truncator(text).words(getattr(settings, 'BLOG_EXCERPT_WORDS', 50))
+
+    def refresh_rendered_content(self):
+        if self.content_html_version != markdown_render_version():
+            # 렌더러 버전이 바뀐 경우에만 다시 렌더링하고 저장해둔다
+            self.render_content()
+            if self.pk is not None:
+                Post.objects.filter(pk=self.pk, content=self.content).update(
+                    content_html=self.content_html,
+                    content_html_version=self.content_html_version,
+                    excerpt=self.excerpt,
+                )
+
+    @timed('markdown')
     def get_markdown_content(self):
-        return markdown(self.content)
+        self.refresh_rendered_content()
+        return self.content_html
+
+    def get_excerpt(self):
+        self.refresh_rendered_content()
+        return self.excerpt
 
     def get_update_url(self):
         return self.get_absolute_url() + 'update/'
 
+    def get_head_image_widths(self):
+        return [int(w) for w in self.head_image_widths.split(',') if w]
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     text = MarkdownxField()
@@ -59,9 +166,124 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    text_html = models.TextField(blank=True, editable=False)
+    text_html_version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # 게시물의 마지막 댓글 시각 (댓글을 지울 때 last_comment_at 다시 계산)
+            models.Index(fields=['post', 'created_at'], name='blog_comment_post_created'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'text' in update_fields:
+            self.render_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'text_html', 'text_html_version'}
+        # post_save에서 갱신하는 게시물의 댓글 통계도 같은 트랜잭션에 묶는다
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Comment, instance=self)):
+            super(Comment, self).save(*args, **kwargs)
+
+    def render_text(self):
+        self.text_html = markdown(self.text)
+        self.text_html_version = markdown_render_version()
+
+    @timed('markdown')
     def get_markdown_content(self):
-        return markdown(self.text)
+        if self.text_html_version != markdown_render_version():
+            self.render_text()
+            if self.pk is not None:
+                Comment.objects.filter(pk=self.pk, text=self.text).update(
+                    text_html=self.text_html,
+                    text_html_version=self.text_html_version,
+                )
+        return self.text_html
 
     def get_absolute_url(self):
         return self.post.get_absolute_url() + '#comment-id-{}'.format(self.pk)
 
+
+
+class RelatedPost(models.Model):
+    # 게시물마다 미리 계산해 둔 비슷한 게시물 (blog/related.py). rank 0이 가장 비슷하다
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_from')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # 상세 페이지는 (post_id, rank) 인덱스로 읽는다
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_relatedpost_post_rank'),
+        ]
+
+    def __str__(self):
+        return '{} -> {} ({:.3f})'.format(self.post_id, self.related_id, self.score)
+
+
+
+class MediaBlob(models.Model):
+    # 업로드 파일 내용 hash -> 저장된 이름 (hallaplantproject.storage.ContentAddressedStorage에서 중복 제거용)
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+
+class Job(models.Model):
+    # 요청 처리 후에 해도 되는 작업 (blog/jobs.py, manage.py run_jobs)
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'pending'),
+        (RUNNING, 'running'),
+        (FAILED, 'failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.TextField(default='{}') # json (작업 함수의 kwargs)
+    key = models.CharField(max_length=200, blank=True, db_index=True) # 같은 key의 대기중인 작업은 하나만 둔다
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='blog_job_status_run_after'),
+        ]
+
+    def __str__(self):
+        return '{} #{} ({})'.format(self.name, self.pk, self.status)
+
+
+class ProfileCapture(models.Model):
+    # staff가 요청한 sampling profile 결과 (hallaplantproject/profiling.py)
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.PositiveIntegerField()
+    samples = models.PositiveIntegerField()
+    interval_ms = models.FloatField()
+    # 함수별 self/total sample 수
+    summary = models.TextField(blank=True)
+    # flame graph용 folded stack 파일 (flamegraph.pl, speedscope)
+    stacks = models.FileField(storage=ProfileStorage())
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return '{} {} ({}ms)'.format(self.method, self.path, self.duration_ms)
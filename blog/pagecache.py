@@ -0,0 +1,89 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from hallaplantproject import routers
+
+VERSION_KEY = 'page:v:{}'
+
+
+def get_versions(names):
+    """의존하는 객체들의 현재 버전 토큰. 캐시에서 사라진 버전은 새로 만든다."""
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, '') for key in keys]
+
+
+def bump_versions(names):
+    names = sorted(set(names))
+    if not names:
+        return
+
+    def bump():
+        # 버전을 숫자로 올리지 않고 새 토큰으로 바꾼다 (캐시에서 밀려났다 다시 생겨도 예전 페이지와 겹치지 않음)
+        cache.set_many({VERSION_KEY.format(name): uuid.uuid4().hex for name in names}, None)
+
+    bump()
+    # 커밋 전에 다른 요청이 예전 데이터를 새 버전으로 캐시했을 수 있으므로 커밋 후에 한번 더 바꾼다
+    transaction.on_commit(bump)
+
+
+class PageCacheMixin:
+    """
+    GET 응답 전체를 캐시한다. 페이지 HTML에는 사용자별 내용이 없으므로 (blog/me/) 로그인한 사용자도 같은 캐시를 쓴다.
+    캐시 키에 get_cache_dependencies()의 버전이 들어가므로 signals에서 버전을 바꾸면 바로 무효화된다.
+    """
+    page_cache_timeout = None
+
+    def get_cache_dependencies(self):
+        return []
+
+    def page_cache_allowed(self, request):
+        if request.COOKIES.get(routers.sticky_cookie_name()):
+            return False # 방금 글을 쓴 브라우저에는 캐시된 예전 페이지를 주지 않는다
+        return request.method in ('GET', 'HEAD')
+
+    def get_page_cache_key(self, request):
+        versions = get_versions(self.get_cache_dependencies())
+        raw = '|'.join([request.get_full_path()] + versions)
+        return 'page:{}'.format(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    def get_page_cache_timeout(self):
+        if self.page_cache_timeout is not None:
+            timeout = self.page_cache_timeout
+        else:
+            timeout = getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 60 * 60 * 24)
+        if routers.reading_from_replica():
+            timeout = min(timeout, getattr(settings, 'DATABASE_REPLICA_PAGE_CACHE_TIMEOUT', 30))
+        return timeout
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.page_cache_allowed(request):
+            return super(PageCacheMixin, self).dispatch(request, *args, **kwargs)
+
+        key = self.get_page_cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+        response = super(PageCacheMixin, self).dispatch(request, *args, **kwargs)
+        if request.method == 'GET' and response.status_code == 200 and not response.streaming:
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(lambda r: self.store_page(request, key, r))
+            else:
+                self.store_page(request, key, response)
+        return response
+
+    def store_page(self, request, key, response):
+        # 쿠키를 심거나 CSRF 토큰을 쓴 응답은 다른 사용자에게 줄 수 없다
+        if response.cookies or request.META.get('CSRF_COOKIE_USED'):
+            return
+        cache.set(key, response, self.get_page_cache_timeout())
@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(values):
+    data = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw.decode('utf-8'))
+        if not isinstance(data, list) or len(data) != len(fields):
+            raise ValueError
+        return [field.to_python(value) for field, value in zip(fields, data)]
+    except (ValueError, TypeError, binascii.Error, ValidationError) as e:
+        raise Http404('잘못된 페이지 커서입니다.') from e
+
+
+class CursorPage:
+    """page_obj 대신 template에 넘겨지는 keyset 페이지. 전체 개수는 알지 못한다."""
+
+    def __init__(self, object_list, query, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.query = query
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _link(self, key, cursor):
+        query = self.query.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query[key] = cursor
+        return '?' + query.urlencode()
+
+    @property
+    def next_link(self):
+        return self._link('after', self.next_cursor) if self.has_next() else ''
+
+    @property
+    def previous_link(self):
+        return self._link('before', self.previous_cursor) if self.has_previous() else ''
+
+
+class NumberedPage(CursorPage):
+    """검색 결과처럼 keyset으로 나눌 수 없는 목록용. 역시 전체 개수는 세지 않는다."""
+
+    def __init__(self, object_list, query, number, has_next):
+        super(NumberedPage, self).__init__(
+            object_list,
+            query,
+            next_cursor=number + 1 if has_next else None,
+            previous_cursor=number - 1 if number > 1 else None,
+        )
+        self.number = number
+
+    def _link(self, key, cursor):
+        query = self.query.copy()
+        query['page'] = cursor
+        return '?' + query.urlencode()
+
+
+class KeysetPaginationMixin:
+    """
+    ListView에서 OFFSET/COUNT 없이 (created, pk) 같은 정렬 키 기준으로 페이지를 나눈다.
+    ?after=<cursor> 는 다음(더 오래된) 페이지, ?before=<cursor> 는 이전(더 최신) 페이지.
+    """
+    keyset_ordering = ('-created', '-pk')
+
+    def get_paginate_by(self, queryset):
+        if self.paginate_by is not None:
+            return self.paginate_by
+        return getattr(settings, 'BLOG_POSTS_PER_PAGE', 5)
+
+    def get_keyset_fields(self, model):
+        return [
+            model._meta.pk if name.lstrip('-') == 'pk' else model._meta.get_field(name.lstrip('-'))
+            for name in self.keyset_ordering
+        ]
+
+    def get_keyset_values(self, obj):
+        return [getattr(obj, name.lstrip('-')) for name in self.keyset_ordering]
+
+    def keyset_filter(self, values, forward):
+        # (a, b) 순서에서 커서 다음 항목: a < a0 or (a = a0 and b < b0) (내림차순 기준)
+        condition = Q()
+        for i, name in enumerate(self.keyset_ordering):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            term = Q(**{'{}__{}'.format(field, lookup): values[i]})
+            for prev_name, prev_value in zip(self.keyset_ordering[:i], values[:i]):
+                term &= Q(**{prev_name.lstrip('-'): prev_value})
+            condition |= term
+        return condition
+
+    def reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else '-' + name for name in self.keyset_ordering]
+
+    def paginate_queryset(self, queryset, page_size):
+        fields = self.get_keyset_fields(queryset.model)
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+
+        if before:
+            values = decode_cursor(before, fields)
+            rows = list(
+                queryset.filter(self.keyset_filter(values, forward=False))
+                .order_by(*self.reversed_ordering())[:page_size + 1]
+            )
+            has_previous = len(rows) > page_size
+            object_list = rows[:page_size][::-1]
+            has_next = True  # 커서 위치의 게시물(또는 그 이후)이 남아있음
+        else:
+            queryset = queryset.order_by(*self.keyset_ordering)
+            if after:
+                values = decode_cursor(after, fields)
+                queryset = queryset.filter(self.keyset_filter(values, forward=True))
+            rows = list(queryset[:page_size + 1])
+            has_next = len(rows) > page_size
+            object_list = rows[:page_size]
+            has_previous = bool(after)
+
+        next_cursor = previous_cursor = None
+        if object_list:
+            if has_next:
+                next_cursor = encode_cursor(self.get_keyset_values(object_list[-1]))
+            if has_previous:
+                previous_cursor = encode_cursor(self.get_keyset_values(object_list[0]))
+
+        page = CursorPage(object_list, self.request.GET, next_cursor, previous_cursor)
+        return None, page, object_list, page.has_other_pages()
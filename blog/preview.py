@@ -0,0 +1,142 @@
+"""
+markdownx 편집기의 미리보기(/markdownx/markdownify/)를 대신 처리한다.
+
+편집기는 입력이 잠깐 멈출 때마다 본문 전체를 보내 렌더링을 요청하므로 긴 글을 여러 명이 쓰면 CPU를 많이 쓴다.
+
+- 같은 내용은 다시 렌더링하지 않는다 (내용 hash를 key로 하는 프로세스 LRU 캐시)
+- 한 사용자의 렌더링은 한번에 하나씩. 기다리는 동안 더 새 요청이 오면 기다리던 요청은 렌더링하지 않고
+  마지막으로 렌더링한 결과를 돌려준다 (편집기는 곧 새 요청의 결과로 바꿈)
+- 사용자별로 BLOG_PREVIEW_RATE 이상 렌더링하면 429 (캐시 hit는 세지 않는다)
+
+coalescing은 프로세스 안에서만, rate limit은 django cache로 worker들이 같이 센다.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from markdownx.settings import MARKDOWNX_MARKDOWNIFY_FUNCTION
+from markdownx.views import MarkdownifyView
+
+from hallaplantproject.lru import LRUCache
+from hallaplantproject.metrics import timed
+
+from .models import markdown_render_version
+
+markdownify = timed('markdown')(import_string(MARKDOWNX_MARKDOWNIFY_FUNCTION))
+
+rendered = LRUCache(
+    max_entries=getattr(settings, 'BLOG_PREVIEW_CACHE_ENTRIES', 1000),
+    max_size=getattr(settings, 'BLOG_PREVIEW_CACHE_SIZE', 8 * 1024 * 1024),
+)
+
+RATE_LIMITED_HTML = '<p class="text-muted">미리보기 요청이 너무 많습니다. 잠시 후 다시 표시됩니다.</p>'
+
+
+class EditorState:
+    """사용자 한 명의 미리보기 요청 상태"""
+
+    def __init__(self):
+        self.render_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.latest = 0 # 마지막으로 들어온 요청 번호
+        self.last_html = None # 마지막으로 돌려준 렌더링 결과
+
+    def next_request(self):
+        with self.lock:
+            self.latest += 1
+            return self.latest
+
+    def superseded(self, number):
+        with self.lock:
+            return number != self.latest
+
+
+editors = LRUCache(max_entries=1000)
+editors_lock = threading.Lock()
+
+
+def editor_state(ident):
+    with editors_lock:
+        state = editors.get(ident)
+        if state is None:
+            state = EditorState()
+            editors.set(ident, state)
+        return state
+
+
+def content_key(content):
+    raw = '{}|{}|{}'.format(MARKDOWNX_MARKDOWNIFY_FUNCTION, markdown_render_version(), content)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def client_ident(request):
+    user = request.user
+    if user.is_authenticated:
+        return 'user:{}'.format(user.pk)
+    return 'ip:{}'.format(request.META.get('REMOTE_ADDR', ''))
+
+
+def allow_render(ident):
+    """고정 window로 센다. 넘으면 다음 window까지 남은 시간(초), 아니면 None"""
+    limit, period = getattr(settings, 'BLOG_PREVIEW_RATE', (20, 10))
+    window = int(time.time() // period)
+    key = 'preview-rate:{}:{}'.format(ident, window)
+    cache.add(key, 0, period + 1)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # 그 사이 만료됨
+        cache.set(key, 1, period + 1)
+        count = 1
+    if count <= limit:
+        return None
+    return max(1, int((window + 1) * period - time.time()) + 1)
+
+
+class MarkdownPreview(MarkdownifyView):
+
+    def post(self, request, *args, **kwargs):
+        content = request.POST.get('content', '')
+        key = content_key(content)
+        ident = client_ident(request)
+
+        html = rendered.get(key)
+        if html is not None:
+            return self.preview_response(ident, html, 'hit')
+
+        state = editor_state(ident)
+        number = state.next_request()
+        if not state.render_lock.acquire(timeout=getattr(settings, 'BLOG_PREVIEW_WAIT', 5)):
+            return self.preview_response(ident, state.last_html or '', 'busy', status=503)
+        try:
+            if state.superseded(number) and state.last_html is not None:
+                return self.preview_response(ident, state.last_html, 'superseded')
+
+            # 기다리는 동안 다른 요청이 같은 내용을 렌더링했을 수 있다
+            html = rendered.get(key)
+            if html is not None:
+                return self.preview_response(ident, html, 'hit')
+
+            retry_after = allow_render(ident)
+            if retry_after is not None:
+                response = self.preview_response(ident, state.last_html or RATE_LIMITED_HTML, 'limited', status=429)
+                response['Retry-After'] = str(retry_after)
+                return response
+
+            html = markdownify(content)
+            rendered.set(key, html)
+            return self.preview_response(ident, html, 'miss')
+        finally:
+            state.render_lock.release()
+
+    def preview_response(self, ident, html, outcome, status=200):
+        if status == 200:
+            editor_state(ident).last_html = html
+        response = HttpResponse(html, status=status)
+        response['X-Preview-Cache'] = outcome
+        response['Cache-Control'] = 'private, no-store'
+        return response
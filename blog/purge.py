@@ -0,0 +1,135 @@
+"""
+앞단 HTTP 캐시(CDN, varnish 등)를 surrogate key로 비운다.
+
+블로그 페이지 응답에는 의존하는 key들(blog/invalidation.py)이 Surrogate-Key 헤더로 붙는다.
+touch()로 key가 바뀌면 purge 작업 하나에 key를 모아 두었다가(BLOG_PURGE_DELAY) 한번에 BLOG_PURGE_URL로 보낸다.
+
+    POST BLOG_PURGE_URL
+    {"surrogate_keys": ["post:1", "posts", ...]}
+
+BLOG_PURGE_URL이 비어 있으면 아무것도 하지 않는다. PurgeReceiver는 테스트와 개발용으로 이 요청을 받아 기록하는 서버.
+"""
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+from django.conf import settings
+
+PURGE_JOB = 'cdn.purge'
+# 대기중인 purge 작업은 하나만 두고 key를 거기에 더한다
+PURGE_JOB_KEY = 'cdn:purge'
+# 대기중인 작업에 key를 더하다 다른 요청과 겹쳤을 때 다시 시도하는 횟수. 넘으면 새 작업을 만든다
+PURGE_MERGE_ATTEMPTS = 5
+
+
+def surrogate_key(key):
+    # 헤더에 넣을 수 있도록 (공백 구분, ASCII) 한글 slug 등은 percent-encoding
+    return quote(key, safe=':_-.')
+
+
+def surrogate_key_header(keys):
+    return ' '.join(sorted(surrogate_key(key) for key in set(keys)))
+
+
+def purge_url():
+    return getattr(settings, 'BLOG_PURGE_URL', '')
+
+
+def queue_purge(keys):
+    from .jobs import enqueue
+    from .models import Job
+
+    if not purge_url():
+        return None
+    keys = set(keys)
+    if not keys:
+        return None
+
+    delay = getattr(settings, 'BLOG_PURGE_DELAY', 1)
+    for _ in range(PURGE_MERGE_ATTEMPTS):
+        pending = Job.objects.filter(key=PURGE_JOB_KEY, status=Job.PENDING).first()
+        if pending is None:
+            job = enqueue(PURGE_JOB, {'keys': sorted(keys)}, key=PURGE_JOB_KEY, delay=delay)
+            # 그 사이 다른 요청이 만든 작업이 돌아왔으면 거기에 더한다
+            if job is None or keys <= set(json.loads(job.payload)['keys']):
+                return job
+            continue
+        merged = sorted(set(json.loads(pending.payload)['keys']) | keys)
+        # 읽은 payload 그대로일 때만 바꾼다. 그 사이 다른 요청이 key를 더했거나 worker가 가져갔으면 다시 읽는다
+        updated = Job.objects.filter(pk=pending.pk, status=Job.PENDING, payload=pending.payload) \
+            .update(payload=json.dumps({'keys': merged}))
+        if updated:
+            return pending
+    # 계속 겹치면 따로 보낸다
+    return enqueue(PURGE_JOB, {'keys': sorted(keys)}, delay=delay)
+
+
+def send_purge(keys):
+    """keys를 BLOG_PURGE_BATCH_SIZE개씩 나눠 보낸다. 실패하면 예외 (작업이 다시 시도됨)"""
+    url = purge_url()
+    if not url:
+        return
+    keys = sorted({surrogate_key(key) for key in keys})
+    batch_size = getattr(settings, 'BLOG_PURGE_BATCH_SIZE', 256)
+    headers = {'Content-Type': 'application/json'}
+    headers.update(getattr(settings, 'BLOG_PURGE_HEADERS', {}))
+    for start in range(0, len(keys), batch_size):
+        body = json.dumps({'surrogate_keys': keys[start:start + batch_size]}).encode('utf-8')
+        request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=getattr(settings, 'BLOG_PURGE_TIMEOUT', 5)) as response:
+            response.read()
+
+
+class PurgeReceiver:
+    """
+    purge 요청을 받아 purged에 기록하는 로컬 서버.
+
+        receiver = PurgeReceiver().start()
+        with override_settings(BLOG_PURGE_URL=receiver.url): ...
+        receiver.stop()
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, status=200):
+        self.host = host
+        self.port = port
+        self.status = status
+        self.purged = [] # 요청마다 받은 key 목록
+        self.headers = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/purge'.format(self.host, self.server.server_address[1])
+
+    @property
+    def keys(self):
+        with self.lock:
+            return {key for batch in self.purged for key in batch}
+
+    def start(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if receiver.status == 200:
+                    with receiver.lock:
+                        receiver.purged.append(json.loads(body.decode('utf-8'))['surrogate_keys'])
+                        receiver.headers.append(dict(self.headers))
+                self.send_response(receiver.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='purge-receiver', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,207 @@
+"""
+게시물마다 비슷한 게시물 top-K(BLOG_RELATED_POSTS)를 미리 계산해 RelatedPost에 저장한다.
+상세 페이지는 저장된 것을 (post_id, rank) 인덱스로 한번에 읽기만 한다.
+
+비슷한 정도 = 태그와 제목 단어로 만든 벡터의 cosine
+    태그 가중치는 idf = log(1 + N / df), 제목 단어는 BLOG_RELATED_TITLE_WEIGHT (0이면 태그만)
+    후보는 태그를 하나 이상 같이 가진 게시물이다. 제목 단어는 후보들 사이의 점수에만 더한다
+    BLOG_RELATED_MAX_POSTINGS개보다 많은 게시물에 붙은 태그는 구분에 별 도움이 안 되고 계산만 커지므로 뺀다
+
+역색인(태그 -> [(게시물, 가중치)])을 만들고 게시물마다 같은 태그를 가진 게시물들에만 점수를 더한다 (희소 행렬 곱).
+전체는 manage.py rebuild_related_posts. 태그나 제목이 바뀌면 작업(related.update_posts)에서
+벡터가 바뀐 게시물(바뀐 게시물, df가 바뀐 태그를 가진 게시물)과 그들과 태그를 같이 가진 게시물만 다시 계산한다.
+게시물 수(N)가 바뀌면 모든 idf가 조금씩 바뀌므로 잠시 뒤 전체를 다시 만든다 (related.rebuild 작업).
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Post, RelatedPost
+
+TITLE_TERM_RE = re.compile(r'\w{2,}')
+# 저장된 점수와 이 정도 이내로 같으면 다시 쓰지 않는다
+SCORE_TOLERANCE = 1e-9
+
+
+def related_count():
+    return getattr(settings, 'BLOG_RELATED_POSTS', 5)
+
+
+def title_terms(title):
+    return {term.lower() for term in TITLE_TERM_RE.findall(title or '')}
+
+
+class SimilarityIndex:
+
+    def __init__(self, tags, titles, document_frequency, total):
+        """tags: {pk: {tag_id}}, titles: {pk: title}, document_frequency: {tag_id: 게시물 수} (전체 기준)"""
+        max_postings = getattr(settings, 'BLOG_RELATED_MAX_POSTINGS', 1000)
+        self.title_weight = getattr(settings, 'BLOG_RELATED_TITLE_WEIGHT', 0.5)
+
+        self.vectors = {}
+        self.terms = {}
+        self.norms = {}
+        self.postings = defaultdict(list)
+        for pk, title in titles.items():
+            vector = {}
+            for tag_id in tags.get(pk, ()):
+                df = document_frequency.get(tag_id, 0)
+                # 게시물 하나에만 붙은 태그는 다른 게시물과 겹치지 않는다
+                if 2 <= df <= max_postings:
+                    vector[tag_id] = math.log(1 + total / df)
+            self.vectors[pk] = vector
+            self.terms[pk] = title_terms(title) if self.title_weight else set()
+            self.norms[pk] = math.sqrt(
+                sum(w * w for w in vector.values()) + len(self.terms[pk]) * self.title_weight ** 2
+            )
+            for tag_id, weight in vector.items():
+                self.postings[tag_id].append((pk, weight))
+
+    @classmethod
+    def build(cls, post_ids=None):
+        """
+        post_ids가 없으면 모든 게시물, 있으면 그 게시물들과 태그를 같이 가진 게시물들만 불러온다.
+        불러온 게시물의 점수는 전체로 만든 것과 같다 (df와 N은 전체 기준)
+        """
+        links = Post.tags.through.objects.order_by()
+        posts = Post.objects.order_by()
+        if post_ids is not None:
+            post_ids = list(post_ids)
+            posts = posts.filter(pk__in=candidates(post_ids)) | posts.filter(pk__in=post_ids)
+            links = links.filter(post_id__in=posts.values('pk'))
+
+        tags = defaultdict(set)
+        for post_id, tag_id in links.values_list('post_id', 'tag_id'):
+            tags[post_id].add(tag_id)
+        titles = dict(posts.values_list('pk', 'title'))
+        if post_ids is None:
+            document_frequency = Counter(tag_id for post_tags in tags.values() for tag_id in post_tags)
+        else:
+            document_frequency = tag_frequency({tag_id for post_tags in tags.values() for tag_id in post_tags})
+        return cls(tags, titles, document_frequency, Post.objects.count())
+
+    def __contains__(self, pk):
+        return pk in self.vectors
+
+    def scores(self, pk):
+        """{다른 게시물 pk: cosine}. 태그가 겹치지 않는 게시물은 들어있지 않다"""
+        vector = self.vectors.get(pk)
+        if not vector:
+            return {}
+        dot = defaultdict(float)
+        for tag_id, weight in vector.items():
+            for other, other_weight in self.postings[tag_id]:
+                if other != pk:
+                    dot[other] += weight * other_weight
+        terms = self.terms[pk]
+        if terms:
+            for other in dot:
+                dot[other] += len(terms & self.terms[other]) * self.title_weight ** 2
+        norm = self.norms[pk]
+        return {other: value / (norm * self.norms[other]) for other, value in dot.items()}
+
+    def neighbours(self, pk, k=None):
+        """[(pk, score)] 비슷한 순. 점수가 같으면 최근 게시물(pk가 큰 것) 먼저"""
+        return top(self.scores(pk).items(), k)
+
+
+def tag_frequency(tag_ids):
+    """{tag_id: 게시물 수}"""
+    return dict(
+        Post.tags.through.objects.order_by().filter(tag_id__in=tag_ids)
+        .values('tag_id').annotate(df=Count('pk')).values_list('tag_id', 'df')
+    )
+
+
+def candidates(post_ids):
+    """post_ids와 쓰이는 태그(2 <= df <= BLOG_RELATED_MAX_POSTINGS)를 같이 가진 게시물 (subquery)"""
+    max_postings = getattr(settings, 'BLOG_RELATED_MAX_POSTINGS', 1000)
+    links = Post.tags.through.objects.order_by()
+    own_tags = links.filter(post_id__in=post_ids).values('tag_id')
+    usable = [tag_id for tag_id, df in tag_frequency(own_tags).items() if 2 <= df <= max_postings]
+    return links.filter(tag_id__in=usable).values('post_id')
+
+
+def top(scored, k=None):
+    return heapq.nlargest(k or related_count(), scored, key=lambda item: (item[1], item[0]))
+
+
+def store(pk, neighbours, existing):
+    """
+    pk의 RelatedPost를 neighbours로 바꾼다. existing은 저장된 [(pk, score)].
+    점수만 바뀌었으면 다시 쓰고, 순서가 바뀌었을 때만 True (상세 페이지를 무효화할 것)
+    """
+    same_order = [other for other, _ in existing] == [other for other, _ in neighbours]
+    if same_order and all(abs(a[1] - b[1]) <= SCORE_TOLERANCE for a, b in zip(existing, neighbours)):
+        return False
+    RelatedPost.objects.filter(post_id=pk).delete()
+    RelatedPost.objects.bulk_create([
+        RelatedPost(post_id=pk, related_id=other, rank=rank, score=score)
+        for rank, (other, score) in enumerate(neighbours)
+    ])
+    return not same_order
+
+
+def stored_lists(post_ids):
+    lists = defaultdict(list)
+    post_ids = sorted(post_ids)
+    for start in range(0, len(post_ids), 500):
+        rows = RelatedPost.objects.filter(post_id__in=post_ids[start:start + 500]) \
+            .order_by('post_id', 'rank').values_list('post_id', 'related_id', 'score')
+        for pk, related_id, score in rows:
+            lists[pk].append((related_id, score))
+    return lists
+
+
+def rebuild(batch_size=500):
+    """모든 게시물을 다시 계산하고 목록(순서)이 바뀐 게시물 pk들을 반환한다"""
+    index = SimilarityIndex.build()
+    post_ids = sorted(index.vectors)
+    changed = []
+    for start in range(0, len(post_ids), batch_size):
+        chunk = post_ids[start:start + batch_size]
+        existing = stored_lists(chunk)
+        with transaction.atomic():
+            for pk in chunk:
+                if store(pk, index.neighbours(pk), existing.get(pk, [])):
+                    changed.append(pk)
+    return changed
+
+
+def update_posts(post_ids, tag_ids=()):
+    """
+    post_ids: 태그나 제목이 바뀐 게시물, 또는 지워진 게시물을 목록에 가지고 있던 게시물
+    tag_ids: 붙거나 떨어져서 df가 바뀐 태그
+
+    점수가 바뀔 수 있는 게시물을 모두 새 index로 처음부터 다시 계산한다 (저장된 점수는 쓰지 않는다).
+    목록이 바뀌었거나 post_ids가 목록에 보이는 게시물 pk들을 반환한다 (상세 페이지를 무효화할 것)
+    """
+    post_ids = set(post_ids)
+    # 벡터가 바뀐 게시물: 바뀐 게시물과, df가 바뀐 태그를 가진 게시물 (그 태그의 idf가 바뀜)
+    changed_vectors = post_ids | set(
+        Post.tags.through.objects.order_by().filter(tag_id__in=tag_ids).values_list('post_id', flat=True)
+    )
+    # 그들과 태그를 같이 가진 게시물은 그들과의 점수가 바뀐다
+    targets = changed_vectors | set(candidates(changed_vectors).values_list('post_id', flat=True))
+    listing = set(RelatedPost.objects.filter(related__in=post_ids).values_list('post_id', flat=True))
+    targets |= listing
+
+    index = SimilarityIndex.build(targets)
+    existing = stored_lists(targets)
+    changed = set()
+    with transaction.atomic():
+        for pk in sorted(targets):
+            if pk in index and store(pk, index.neighbours(pk), existing.get(pk, [])):
+                changed.add(pk)
+    # 목록이 그대로여도 제목이 바뀌었을 수 있다
+    return changed | listing
+
+
+def related_posts(post):
+    """상세 페이지에 보여줄 게시물들 (쿼리 한번, (post_id, rank) 인덱스)"""
+    return Post.objects.filter(related_from__post=post.pk).order_by('related_from__rank').only('pk', 'title', 'created')
@@ -0,0 +1,93 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .models import Post
+
+# SQLite FTS5 역색인. rowid = blog_post.id
+FTS_TABLE = 'blog_post_fts'
+# bm25 컬럼 가중치 (title, content, tags, comments)
+FTS_WEIGHTS = (10.0, 1.0, 5.0, 0.5)
+
+
+def search_enabled(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def include_comments():
+    return getattr(settings, 'BLOG_SEARCH_INCLUDE_COMMENTS', False)
+
+
+def document_for(post):
+    tags = ' '.join(tag.name for tag in post.tags.all())
+    comments = ''
+    if include_comments():
+        comments = '\n'.join(comment.text for comment in post.comment_set.all())
+    return [post.title, post.content, tags, comments]
+
+
+def index_post(post):
+    using = router.db_for_write(Post, instance=post)
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [post.pk])
+        cursor.execute(
+            'INSERT INTO {}(rowid, title, content, tags, comments) VALUES (%s, %s, %s, %s, %s)'.format(FTS_TABLE),
+            [post.pk] + document_for(post),
+        )
+
+
+def index_posts(post_ids):
+    posts = Post.objects.filter(pk__in=list(post_ids)).prefetch_related('tags')
+    if include_comments():
+        posts = posts.prefetch_related('comment_set')
+    for post in posts:
+        index_post(post)
+
+
+def remove_post(post_id):
+    using = router.db_for_write(Post)
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [post_id])
+
+
+def rebuild_index():
+    using = router.db_for_write(Post)
+    if not search_enabled(using):
+        return 0
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+        post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(post_ids), 500):
+            index_posts(post_ids[start:start + 500])
+    return len(post_ids)
+
+
+def build_match_query(text):
+    # 사용자 입력을 그대로 MATCH에 넣으면 FTS 문법 오류가 나므로 단어마다 따옴표로 감싸고 접두어 검색
+    words = re.findall(r'\w+', text or '')
+    return ' '.join('"{}"*'.format(word) for word in words[:10])
+
+
+def search_post_ids(text, limit, offset=0):
+    """순위(bm25)순으로 post id 목록을 반환한다."""
+    match = build_match_query(text)
+    using = router.db_for_read(Post)
+    if not match or not search_enabled(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+            'ORDER BY bm25({table}, {weights}) LIMIT %s OFFSET %s'.format(
+                table=FTS_TABLE,
+                weights=', '.join(str(w) for w in FTS_WEIGHTS),
+            ),
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
@@ -0,0 +1,183 @@
+"""
+벤치마크용 가짜 데이터. random seed가 같으면 항상 같은 데이터가 만들어진다.
+
+bulk_create로 넣으므로 signals가 돌지 않는다. 대신 마지막에 카운터, 댓글 통계, 검색 색인, 관련 게시물, 캐시를 한번에 갱신한다.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import related, search
+from .invalidation import POSTS, SIDEBAR, category_key, post_key, tag_key, touch
+from .models import Post, Category, Tag, Comment
+from .signals import recount_categories, recount_comments
+
+WORDS = (
+    'plant leaf root stem flower seed soil water light garden greenhouse fern moss cactus orchid '
+    'succulent pot repot fertilizer humidity sunlight shade prune cutting propagate bloom '
+    'hallasan jeju forest trail season spring summer autumn winter rain wind mountain valley '
+    '식물 잎 뿌리 줄기 꽃 씨앗 흙 물 햇빛 정원 온실 고사리 이끼 선인장 난초 다육이 화분 분갈이 '
+    '비료 습도 그늘 가지치기 삽목 번식 개화 한라산 제주 숲 산책로 계절 봄 여름 가을 겨울'
+).split()
+
+
+class Generator:
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def words(self, low, high):
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(low, high)))
+
+    def sentence(self):
+        text = self.words(6, 18)
+        return text[0].upper() + text[1:] + '.'
+
+    def paragraph(self):
+        words = ' '.join(self.sentence() for _ in range(self.random.randint(2, 7))).split(' ')
+        # 강조와 링크를 하나씩
+        i = self.random.randrange(len(words))
+        words[i] = '**{}**'.format(words[i])
+        i = self.random.randrange(len(words))
+        words[i] = '[{}](https://example.com/{})'.format(words[i], i)
+        return ' '.join(words)
+
+    def title(self):
+        return self.words(2, 5)[:30]
+
+    def markdown(self, paragraphs):
+        """제목, 문단, 목록, 코드, 인용, 링크가 섞인 markdown"""
+        blocks = []
+        for i in range(paragraphs):
+            kind = self.random.random()
+            if i and kind < 0.12:
+                blocks.append('## ' + self.words(2, 6))
+            elif kind < 0.22:
+                blocks.append('\n'.join('- ' + self.words(3, 10) for _ in range(self.random.randint(2, 6))))
+            elif kind < 0.27:
+                blocks.append('```\n' + '\n'.join(self.words(2, 8) for _ in range(self.random.randint(2, 8))) + '\n```')
+            elif kind < 0.32:
+                blocks.append('> ' + self.sentence())
+            blocks.append(self.paragraph())
+        return '\n\n'.join(blocks)
+
+    def post_paragraphs(self):
+        # 대부분은 짧고 가끔 아주 긴 글 (로그 정규분포)
+        return max(1, min(120, int(self.random.lognormvariate(2.0, 0.8))))
+
+    def comment_count(self, mean):
+        if mean <= 0:
+            return 0
+        return int(self.random.expovariate(1.0 / mean))
+
+
+def next_id(model):
+    return (model.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+
+
+def seed(users=10, categories=8, tags=40, posts=1000, comments=5, uncategorized=0.1, seed=0, batch_size=500, stdout=None):
+    """데이터를 추가하고 만든 개수를 반환한다 (기존 데이터는 지우지 않음)"""
+    gen = Generator(seed)
+    rand = gen.random
+    now = timezone.now()
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    with transaction.atomic():
+        start = next_id(User)
+        password = make_password('benchmark')
+        User.objects.bulk_create([
+            User(pk=start + i, username='bench_{}'.format(start + i), password=password)
+            for i in range(users)
+        ])
+        authors = list(User.objects.filter(pk__gte=start).values_list('pk', flat=True)) or \
+            list(User.objects.values_list('pk', flat=True))
+
+        start = next_id(Category)
+        Category.objects.bulk_create([
+            Category(pk=start + i, name='category {}'.format(start + i), slug='category-{}'.format(start + i))
+            for i in range(categories)
+        ])
+        category_ids = list(Category.objects.values_list('pk', flat=True))
+
+        start = next_id(Tag)
+        Tag.objects.bulk_create([
+            Tag(pk=start + i, name='tag {}'.format(start + i), slug='tag-{}'.format(start + i))
+            for i in range(tags)
+        ])
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        # 인기 태그가 몰리도록 (zipf)
+        tag_weights = [1.0 / (i + 1) for i in range(len(tag_ids))]
+
+        post_start = next_id(Post)
+        comment_start = next_id(Comment)
+        created = 0
+        comment_total = 0
+        for offset in range(0, posts, batch_size):
+            batch, dates, links, batch_comments = [], [], [], []
+            for i in range(offset, min(posts, offset + batch_size)):
+                pk = post_start + i
+                post = Post(
+                    pk=pk,
+                    title=gen.title(),
+                    content=gen.markdown(gen.post_paragraphs()),
+                    author_id=rand.choice(authors),
+                    category_id=None if not category_ids or rand.random() < uncategorized else rand.choice(category_ids),
+                )
+                post.render_content()
+                batch.append(post)
+                # 최근 3년 사이에 고르게
+                dates.append(now - timedelta(seconds=rand.randint(0, 3 * 365 * 24 * 3600)))
+
+                if tag_ids:
+                    chosen = set(rand.choices(tag_ids, weights=tag_weights, k=rand.randint(0, 5)))
+                    links.extend(Post.tags.through(post_id=pk, tag_id=tag_id) for tag_id in chosen)
+
+                for _ in range(gen.comment_count(comments)):
+                    comment = Comment(
+                        pk=comment_start,
+                        post_id=pk,
+                        author_id=rand.choice(authors),
+                        text=gen.markdown(rand.randint(1, 2)),
+                    )
+                    comment.render_text()
+                    batch_comments.append(comment)
+                    comment_start += 1
+                    comment_total += 1
+
+            Post.objects.bulk_create(batch)
+            # auto_now_add가 created를 덮어쓰므로 다시 넣는다
+            for post, date in zip(batch, dates):
+                post.created = date
+            Post.objects.bulk_update(batch, ['created'], batch_size=batch_size)
+            Post.tags.through.objects.bulk_create(links)
+            Comment.objects.bulk_create(batch_comments)
+            created += len(batch)
+            log('{} / {} posts'.format(created, posts))
+
+        recount_categories()
+        recount_comments()
+        search.rebuild_index()
+        # 새 게시물과 관련 게시물 목록이 바뀐 기존 게시물의 상세 페이지
+        changed_posts = set(range(post_start, post_start + created)) | set(related.rebuild())
+        touch(
+            [POSTS, SIDEBAR]
+            + [post_key(pk) for pk in changed_posts]
+            + [category_key(slug) for slug in Category.objects.values_list('slug', flat=True)]
+            + [category_key(None)]
+            + [tag_key(slug) for slug in Tag.objects.values_list('slug', flat=True)]
+        )
+
+    return {
+        'users': users,
+        'categories': categories,
+        'tags': tags,
+        'posts': created,
+        'comments': comment_total,
+    }
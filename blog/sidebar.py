@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+SIDEBAR_CACHE_KEY = 'blog:sidebar'
+
+
+def get_sidebar_context():
+    # 모든 블로그 페이지 오른쪽의 카테고리 목록. 게시물/카테고리가 바뀔 때 signals에서 지운다
+    context = cache.get(SIDEBAR_CACHE_KEY)
+    if context is None:
+        from .models import Category, Counter
+
+        counter = Counter.objects.filter(name=Counter.POSTS_WITHOUT_CATEGORY).first()
+        context = {
+            'category_list': list(Category.objects.order_by('pk')),
+            'posts_without_category': counter.value if counter else 0,
+        }
+        cache.set(SIDEBAR_CACHE_KEY, context, getattr(settings, 'BLOG_SIDEBAR_CACHE_TIMEOUT', 60 * 10))
+    return context
+
+
+def invalidate_sidebar():
+    from .invalidation import touch, SIDEBAR
+
+    touch([SIDEBAR])
+    cache.delete(SIDEBAR_CACHE_KEY)
+    # 커밋 전에 다른 요청이 예전 값을 다시 캐시했을 수 있으므로 커밋 후에 한번 더 지운다
+    transaction.on_commit(lambda: cache.delete(SIDEBAR_CACHE_KEY))
@@ -0,0 +1,364 @@
+import threading
+
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import search
+from .invalidation import touch, keys_for_posts, keys_for_category_ids, post_key, tag_key, category_key, SIDEBAR
+from .models import Post, Category, Counter, Tag, Comment, ProfileCapture
+from .sidebar import invalidate_sidebar
+from .jobs import enqueue
+from .tasks import queue_search_sync, queue_related_update, queue_related_rebuild
+
+
+def change_category_count(category_id, delta):
+    if not delta:
+        return
+    if category_id is None:
+        updated = Counter.objects.filter(name=Counter.POSTS_WITHOUT_CATEGORY).update(value=F('value') + delta)
+        if not updated:
+            Counter.objects.update_or_create(
+                name=Counter.POSTS_WITHOUT_CATEGORY,
+                defaults={'value': Post.objects.filter(category=None).count()},
+            )
+    else:
+        Category.objects.filter(pk=category_id).update(post_count=F('post_count') + delta)
+    invalidate_sidebar()
+
+
+def recount_categories():
+    # 카운터가 어긋났을 때 전체를 다시 센다
+    for category in Category.objects.all():
+        Category.objects.filter(pk=category.pk).update(post_count=category.post_set.count())
+    Counter.objects.update_or_create(
+        name=Counter.POSTS_WITHOUT_CATEGORY,
+        defaults={'value': Post.objects.filter(category=None).count()},
+    )
+    invalidate_sidebar()
+
+
+def recount_comments(post_ids=None):
+    """댓글 통계가 어긋난 게시물을 실제 댓글로 다시 계산하고 고친 게시물 pk 목록을 반환한다"""
+    posts = Post.objects.order_by('pk')
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    stored = list(posts.values_list('pk', 'comment_count', 'last_comment_at'))
+    fixed = []
+    for start in range(0, len(stored), 500):
+        chunk = stored[start:start + 500]
+        actual = {
+            row['post']: (row['count'], row['latest'])
+            for row in Comment.objects.filter(post__in=[row[0] for row in chunk])
+            .order_by().values('post').annotate(count=Count('pk'), latest=Max('created_at'))
+        }
+        for pk, count, latest in chunk:
+            expected = actual.get(pk, (0, None))
+            if (count, latest) != expected:
+                Post.objects.filter(pk=pk).update(comment_count=expected[0], last_comment_at=expected[1])
+                fixed.append(pk)
+    return fixed
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change_category_count(instance.category_id, +1)
+    elif hasattr(instance, '_loaded_category_id'):
+        if instance._loaded_category_id != instance.category_id:
+            change_category_count(instance._loaded_category_id, -1)
+            change_category_count(instance.category_id, +1)
+    else:
+        # DB에서 불러오지 않은 객체를 저장한 경우 이전 카테고리를 알 수 없음
+        recount_categories()
+    # 아래 핸들러들이 이전 카테고리를 알 수 있도록 남겨둔다
+    instance._previous_category_id = getattr(instance, '_loaded_category_id', instance.category_id)
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_category_count(instance.category_id, -1)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # 카테고리가 지워지면 속한 게시물들은 SET_NULL -> 미분류로 옮겨진다
+    change_category_count(None, Post.objects.filter(category=instance).count())
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_sidebar()
+
+
+# 게시물과 같이(CASCADE) 지워지는 댓글은 댓글마다 통계를 고치거나 무효화하지 않는다 (게시물 삭제에서 한번에 처리)
+# Collector는 pre_delete를 모두 보낸 뒤 댓글, 게시물 순서로 지우고 post_delete를 보낸다
+_deleting = threading.local()
+
+
+def deleting_post_ids():
+    if not hasattr(_deleting, 'post_ids'):
+        _deleting.post_ids = set()
+    return _deleting.post_ids
+
+
+def post_being_deleted(post_id):
+    return post_id in deleting_post_ids()
+
+
+@receiver(pre_delete, sender=Post)
+def mark_post_deleting(sender, instance, **kwargs):
+    deleting_post_ids().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unmark_post_deleting(sender, instance, **kwargs):
+    deleting_post_ids().discard(instance.pk)
+
+
+# 게시물의 댓글 통계 (Post.comment_count, last_comment_at)
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    # 읽고 쓰지 않고 UPDATE 한번으로 더한다 (동시에 달린 댓글도 빠지지 않음)
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') + 1,
+        last_comment_at=Coalesce(Greatest('last_comment_at', instance.created_at), instance.created_at),
+    )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if post_being_deleted(instance.post_id):
+        return
+    latest = Comment.objects.filter(post=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=Subquery(latest),
+    )
+
+
+# 검색 색인 (blog/search.py)
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        queue_search_sync([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    queue_search_sync([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        queue_search_sync([instance.pk])
+    elif action == 'post_clear':
+        # tag.post_set.clear(): 어떤 게시물이었는지 알 수 없으므로 pre_clear에서 기억해둔 값을 쓴다
+        queue_search_sync(getattr(instance, '_cleared_post_ids', []))
+    else:
+        queue_search_sync(pk_set)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def remember_cleared_posts(sender, instance, action, reverse, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_post_ids = list(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        queue_search_sync(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_posts(sender, instance, **kwargs):
+    instance._deleted_post_ids = list(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def index_deleted_tag(sender, instance, **kwargs):
+    queue_search_sync(getattr(instance, '_deleted_post_ids', []))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def index_commented_post(sender, instance, raw=False, **kwargs):
+    if not raw and search.include_comments() and not post_being_deleted(instance.post_id):
+        queue_search_sync([instance.post_id])
+
+
+# 관련 게시물 (blog/related.py). 특징(태그, 제목)이 바뀐 게시물과 df가 바뀐 태그를 다시 계산한다
+
+@receiver(post_save, sender=Post)
+def relate_saved_post(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created or update_fields is None or 'title' in update_fields:
+        queue_related_update([instance.pk])
+    if created:
+        queue_related_rebuild()
+
+
+@receiver(pre_delete, sender=Post)
+def remember_related_listers(sender, instance, **kwargs):
+    # 이 게시물을 목록에 가진 게시물들은 빈 자리를 다시 채운다 (RelatedPost는 CASCADE로 같이 지워짐)
+    instance._related_listers = list(instance.related_from.values_list('post_id', flat=True))
+    instance._related_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def relate_deleted_post(sender, instance, **kwargs):
+    queue_related_update(getattr(instance, '_related_listers', []), getattr(instance, '_related_tag_ids', []))
+    queue_related_rebuild()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def remember_cleared_tags(sender, instance, action, reverse, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def relate_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        tag_ids = getattr(instance, '_cleared_tag_ids', []) if action == 'post_clear' else pk_set
+        queue_related_update([instance.pk], tag_ids)
+    elif action == 'post_clear':
+        queue_related_update(getattr(instance, '_cleared_post_ids', []), [instance.pk])
+    else:
+        queue_related_update(pk_set, [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+def relate_deleted_tag(sender, instance, **kwargs):
+    queue_related_update(getattr(instance, '_deleted_post_ids', []))
+
+
+# 페이지 캐시 무효화 (blog/invalidation.py)
+
+@receiver(post_save, sender=Post)
+def touch_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    keys = keys_for_posts([instance.pk])
+    if not created:
+        keys |= keys_for_category_ids([getattr(instance, '_previous_category_id', instance.category_id)])
+    touch(keys)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_post_keys(sender, instance, **kwargs):
+    # post_delete 시점에는 tags 연결이 이미 지워져 있다
+    instance._dependency_keys = keys_for_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def touch_deleted_post(sender, instance, **kwargs):
+    touch(getattr(instance, '_dependency_keys', {post_key(instance.pk)}))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def touch_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_remove', 'pre_clear'):
+        # 빠지는 태그(또는 게시물)의 목록도 무효화해야 하므로 지워지기 전에 기억한다
+        if reverse:
+            instance._dependency_keys = keys_for_posts(pk_set or instance.post_set.values_list('pk', flat=True))
+        else:
+            instance._dependency_keys = keys_for_posts([instance.pk])
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    keys = set(getattr(instance, '_dependency_keys', set()))
+    if reverse:
+        keys |= keys_for_posts(pk_set or []) | {tag_key(instance.slug)}
+    else:
+        keys |= keys_for_posts([instance.pk])
+    touch(keys)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_commented_post(sender, instance, raw=False, **kwargs):
+    if not raw and not post_being_deleted(instance.post_id):
+        # 목록 카드에도 댓글 수가 보인다
+        touch(keys_for_posts([instance.post_id]))
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Tag)
+def remember_label_keys(sender, instance, raw=False, **kwargs):
+    # 이름/slug가 바뀌면 예전 slug의 목록과 이 카테고리/태그가 보이는 모든 게시물이 바뀐다
+    if raw or instance.pk is None:
+        return
+    keys = keys_for_posts(instance.post_set.values_list('pk', flat=True))
+    old_slug = sender.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+    if sender is Category:
+        keys |= {category_key(old_slug), SIDEBAR}
+    else:
+        keys.add(tag_key(old_slug))
+    instance._dependency_keys = keys
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def touch_label(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = set(getattr(instance, '_dependency_keys', set()))
+    keys.add(category_key(instance.slug) if sender is Category else tag_key(instance.slug))
+    if sender is Category and 'created' not in kwargs:
+        keys.add(category_key(None)) # 삭제되면 게시물들이 미분류로 이동
+    touch(keys)
+
+
+# head_image 크기별 이미지 (blog/images.py)
+
+@receiver(post_save, sender=Post)
+def make_image_derivatives(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_name = '' if created else getattr(instance, '_loaded_head_image', None)
+    new_name = instance.head_image.name or ''
+    if old_name == new_name:
+        return
+
+    # 새 이미지의 파생본이 만들어질 때까지는 원본을 보여준다
+    old_widths = instance.head_image_widths if old_name else ''
+    instance.head_image_widths = ''
+    Post.objects.filter(pk=instance.pk).update(head_image_widths='')
+    instance._loaded_head_image = new_name
+
+    # 이미지 처리는 오래 걸리므로 작업 큐로 넘긴다 (blog/tasks.py)
+    enqueue(
+        'images.head_image_derivatives',
+        {'post_id': instance.pk, 'name': new_name, 'old_name': old_name or '', 'old_widths': old_widths},
+    )
+
+
+# profiler 결과 파일
+
+@receiver(post_delete, sender=ProfileCapture)
+def delete_profile_stacks(sender, instance, **kwargs):
+    if instance.stacks:
+        instance.stacks.delete(save=False)
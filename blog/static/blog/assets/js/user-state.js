@@ -0,0 +1,21 @@
+// 페이지 HTML은 모든 방문자에게 같으므로(캐시 가능) 사용자별 부분은 /blog/me/ 응답으로 채운다
+//   data-show-for="authenticated" / "anonymous" : 로그인 여부에 따라 보이기
+//   data-owner-id="<user id>" : 그 사용자에게만 보이기 (EDIT, 댓글 수정/삭제 버튼)
+//   input[name=csrfmiddlewaretoken] : CSRF 토큰 채우기
+(function () {
+    $.ajax({ url: '/blog/me/', dataType: 'json', cache: false }).done(function (state) {
+        var show = state.authenticated ? 'authenticated' : 'anonymous';
+
+        $('[data-show-for]').each(function () {
+            $(this).toggleClass('d-none', $(this).data('show-for') !== show);
+        });
+
+        $('[data-owner-id]').each(function () {
+            $(this).toggleClass('d-none', !state.authenticated || $(this).data('owner-id') !== state.id);
+        });
+
+        if (state.csrf_token) {
+            $('input[name=csrfmiddlewaretoken]').val(state.csrf_token);
+        }
+    });
+})();
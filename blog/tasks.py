@@ -0,0 +1,78 @@
+from django.conf import settings
+
+from . import images, purge, related, search
+from .invalidation import touch, keys_for_posts, post_key
+from .jobs import job, enqueue
+from .models import Post
+
+
+def queue_search_sync(post_ids):
+    post_ids = sorted(set(post_ids))
+    if not post_ids:
+        return
+    # 게시물 하나에 대한 작업은 대기중인 것이 있으면 새로 만들지 않는다
+    key = 'search:post:{}'.format(post_ids[0]) if len(post_ids) == 1 else ''
+    enqueue('search.sync_posts', {'post_ids': post_ids}, key=key)
+
+
+@job('search.sync_posts')
+def sync_search_index(post_ids):
+    # 그 사이 지워진 게시물은 색인에서도 지운다
+    existing = set(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+    search.index_posts(existing)
+    for pk in set(post_ids) - existing:
+        search.remove_post(pk)
+
+
+@job('images.head_image_derivatives')
+def make_head_image_derivatives(post_id, name, old_name='', old_widths=''):
+    post = Post.objects.filter(pk=post_id).only('pk', 'head_image', 'head_image_widths').first()
+    # 같은 내용의 이미지는 같은 파일이므로 (ContentAddressedStorage) 다른 게시물이 쓰고 있으면 지우지 않는다
+    if old_name and old_widths and not Post.objects.filter(head_image=old_name).exclude(pk=post_id).exists():
+        storage = Post._meta.get_field('head_image').storage
+        images.delete_derivatives(storage, old_name, [int(w) for w in old_widths.split(',') if w])
+    if post is None or (post.head_image.name or '') != name:
+        # 그 사이 이미지가 다시 바뀌었으면 그쪽 작업이 처리한다
+        return
+
+    shared = Post.objects.filter(head_image=name).exclude(pk=post_id).exclude(head_image_widths='') \
+        .values_list('head_image_widths', flat=True).first() if name else None
+    if shared:
+        # 다른 게시물에서 이미 만든 크기별 이미지를 같이 쓴다
+        widths = [int(w) for w in shared.split(',') if w]
+    else:
+        widths = images.generate_derivatives(post.head_image) if name else []
+    Post.objects.filter(pk=post_id).update(head_image_widths=','.join(str(w) for w in widths))
+    # 이미지 태그가 바뀌므로 이 게시물이 보이는 페이지를 무효화한다
+    touch(keys_for_posts([post_id]))
+
+
+@job(purge.PURGE_JOB)
+def purge_surrogate_keys(keys):
+    purge.send_purge(keys)
+
+
+def queue_related_update(post_ids, tag_ids=()):
+    post_ids = sorted(set(post_ids))
+    tag_ids = sorted(set(tag_ids))
+    if not post_ids and not tag_ids:
+        return
+    key = 'related:post:{}'.format(post_ids[0]) if len(post_ids) == 1 and not tag_ids else ''
+    enqueue('related.update_posts', {'post_ids': post_ids, 'tag_ids': tag_ids}, key=key)
+
+
+def queue_related_rebuild():
+    # 게시물 수가 바뀌면 모든 idf가 바뀐다. 대기중인 것이 있으면 그 작업이 같이 처리한다
+    delay = getattr(settings, 'BLOG_RELATED_REBUILD_DELAY', 600)
+    enqueue('related.rebuild', key='related:rebuild', delay=delay)
+
+
+@job('related.update_posts')
+def update_related_posts(post_ids, tag_ids=()):
+    # 관련 게시물 목록이 바뀐 상세 페이지를 무효화한다
+    touch({post_key(pk) for pk in related.update_posts(post_ids, tag_ids)})
+
+
+@job('related.rebuild')
+def rebuild_related_posts():
+    touch({post_key(pk) for pk in related.rebuild()})
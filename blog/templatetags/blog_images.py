@@ -0,0 +1,31 @@
+from django import template
+from django.utils.html import format_html
+
+from blog import images
+
+register = template.Library()
+
+DEFAULT_SIZES = '(max-width: 768px) 100vw, 750px'
+
+
+@register.simple_tag
+def responsive_image(post, css_class='', alt='', sizes=DEFAULT_SIZES):
+    """head_image를 크기별 srcset이 있는 <picture>로 출력한다. 파생 이미지가 없으면 원본 <img>."""
+    field_file = post.head_image
+    widths = post.get_head_image_widths()
+    if not widths:
+        return format_html('<img class="{}" src="{}" alt="{}">', css_class, field_file.url, alt)
+
+    formats = images.available_formats()
+    sources = format_html('')
+    for fmt, ext, mime in formats:
+        if fmt != 'JPEG':
+            sources += format_html(
+                '<source type="{}" srcset="{}" sizes="{}">',
+                mime, images.srcset(field_file, widths, ext), sizes,
+            )
+    fallback = field_file.storage.url(images.derivative_name(field_file.name, widths[-1], 'jpg'))
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" alt="{}"></picture>',
+        sources, css_class, fallback, images.srcset(field_file, widths, 'jpg'), sizes, alt,
+    )
@@ -0,0 +1,173 @@
+import unittest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from .models import Post, Category, Tag, Comment
+from . import related
+
+
+SIZES = (10, 100, 1000)
+
+
+class SeedMixin:
+    def setUp(self):
+        self.client = Client()
+        self.authors = [
+            User.objects.create_user(username='author_{}'.format(i), password='nopassword')
+            for i in range(3)
+        ]
+        self.categories = [
+            Category.objects.create(name='category {}'.format(i), slug='category-{}'.format(i))
+            for i in range(4)
+        ]
+        self.tags = [
+            Tag.objects.create(name='tag {}'.format(i), slug='tag-{}'.format(i))
+            for i in range(5)
+        ]
+        self.detail_post = None
+        self.seeded = 0
+
+    def seed(self, total):
+        posts = []
+        for i in range(self.seeded, total):
+            post = Post(
+                title='post {}'.format(i),
+                content='# post {}\n\nsome *markdown* body'.format(i),
+                author=self.authors[i % len(self.authors)],
+                # 마지막 카테고리 자리는 미분류
+                category=self.categories[i % (len(self.categories) + 1)] if i % (len(self.categories) + 1) < len(self.categories) else None,
+            )
+            post.render_content()
+            posts.append(post)
+        Post.objects.bulk_create(posts)
+
+        new_posts = list(Post.objects.order_by('-pk')[:total - self.seeded])
+        links = [
+            Post.tags.through(post_id=post.pk, tag_id=self.tags[j].pk)
+            for post in new_posts
+            for j in range(post.pk % len(self.tags) + 1)
+        ]
+        Post.tags.through.objects.bulk_create(links)
+
+        if self.detail_post is None:
+            self.detail_post = new_posts[-1]
+        comments = []
+        for i in range(self.seeded, total):
+            comment = Comment(
+                post=self.detail_post,
+                text='comment {}'.format(i),
+                author=self.authors[i % len(self.authors)],
+            )
+            comment.render_text()
+            comments.append(comment)
+        Comment.objects.bulk_create(comments)
+
+        self.seeded = total
+
+
+class TestQueryBudget(SeedMixin, TestCase):
+    """게시물 수가 늘어나도 페이지당 쿼리 수는 그대로여야 한다 (N+1 방지)"""
+
+    def urls(self):
+        return [
+            '/',
+            '/main/',
+            '/blog/',
+            self.detail_post.get_absolute_url(),
+            self.tags[0].get_absolute_url(),
+            self.categories[0].get_absolute_url(),
+            '/blog/category/_none/',
+        ]
+
+    def count_queries(self, url):
+        cache.clear() # sidebar 캐시가 없는 경우를 기준으로 센다
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    @override_settings(BLOG_POSTS_PER_PAGE=50)
+    def test_query_count_constant(self):
+        counts = {}
+        for size in SIZES:
+            self.seed(size)
+            for url in self.urls():
+                counts.setdefault(url, []).append(self.count_queries(url))
+
+        for url, numbers in counts.items():
+            self.assertEqual(len(set(numbers)), 1, '{}: {}'.format(url, numbers))
+
+    @override_settings(BLOG_POSTS_PER_PAGE=50)
+    def test_query_budget(self):
+        self.seed(100)
+        budget = {
+            '/': 2,
+            '/main/': 2,
+            '/blog/': 5,
+            self.detail_post.get_absolute_url(): 7, # + 관련 게시물
+            self.tags[0].get_absolute_url(): 6,
+            self.categories[0].get_absolute_url(): 6,
+            '/blog/category/_none/': 5,
+        }
+        for url, limit in budget.items():
+            self.assertLessEqual(self.count_queries(url), limit, url)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN 형식은 sqlite 기준')
+class TestQueryPlan(SeedMixin, TestCase):
+    """목록 쿼리가 blog_post 전체를 읽고 정렬하지 않는지 (migration 0016의 인덱스를 쓰는지) 확인한다"""
+
+    def list_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return [q['sql'] for q in queries if 'FROM "blog_post"' in q['sql'] and 'ORDER BY' in q['sql']]
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_list_views_use_indexes(self):
+        self.seed(100)
+        response = self.client.get('/blog/')
+        older = response.context['page_obj'].next_link
+        # 댓글 많은 순, 최근 댓글 순 목록은 comment_count, last_comment_at 인덱스 (migration 0018)
+        discussed_older = self.client.get('/blog/?sort=discussed').context['page_obj'].next_link
+
+        urls = [
+            '/blog/',
+            '/blog/' + older,
+            self.categories[0].get_absolute_url(),
+            self.categories[0].get_absolute_url() + older,
+            '/blog/category/_none/',
+            self.tags[0].get_absolute_url(),
+            '/blog/?sort=discussed',
+            '/blog/' + discussed_older,
+            '/blog/?sort=active',
+        ]
+        for url in urls:
+            sqls = self.list_queries(url)
+            self.assertTrue(sqls, url)
+            for sql in sqls:
+                plan = self.query_plan(sql)
+                self.assertNotIn('SCAN blog_post', plan, '{}: {}'.format(url, plan))
+                if url.startswith('/blog/tag/'):
+                    # 태그의 게시물만 정렬한다
+                    self.assertIn('SEARCH blog_post_tags USING COVERING INDEX blog_post_tags_tag_post (tag_id=?)', plan)
+                else:
+                    self.assertFalse([step for step in plan if 'TEMP B-TREE' in step], '{}: {}'.format(url, plan))
+
+    def test_related_posts_use_index(self):
+        self.seed(100)
+        related.rebuild()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(list(related.related_posts(self.detail_post)))
+        plan = self.query_plan(queries[0]['sql'])
+        # 미리 계산한 목록을 (post_id, rank) unique 인덱스 순서대로 읽는다 (sqlite는 sqlite_autoindex_...)
+        self.assertTrue([step for step in plan if step.startswith('SEARCH blog_relatedpost USING INDEX') and '(post_id=?)' in step], plan)
+        self.assertFalse([step for step in plan if 'TEMP B-TREE' in step], plan)
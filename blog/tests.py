@@ -1,6 +1,19 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.db import connection
 from bs4 import BeautifulSoup
-from .models import Post, Category, Tag, Comment
+from .models import Post, Category, Tag, Comment, Counter, ChangeMarker, Job, ProfileCapture, RelatedPost
+from . import jobs, related
+from .purge import PurgeReceiver, surrogate_key
+from django.db.models import F
+from django.core.files.uploadedfile import SimpleUploadedFile
+from datetime import datetime, timedelta
+from io import BytesIO
+from PIL import Image
+import os
+import shutil
+import tempfile
 from django.utils import timezone
 from django.contrib.auth.models import User
 
@@ -119,9 +132,81 @@ class TestModel(TestCase):
         self.assertEqual(Comment.objects.count(), 2)
         self.assertEqual(post_000.comment_set.count(), 2)
 
+    def test_category_post_count(self):
+        def counts():
+            without_category = Counter.objects.get(name=Counter.POSTS_WITHOUT_CATEGORY).value
+            return [c.post_count for c in Category.objects.order_by('pk')] + [without_category]
+
+        category_000 = create_category(name='life')
+        category_001 = create_category(name='정치/사회')
+        post_000 = create_post(
+            title='first post',
+            content='we are the world',
+            author=self.author_000,
+            category=category_000,
+        )
+        post_001 = create_post(
+            title='second post',
+            content='second second seoncd',
+            author=self.author_000,
+        )
+        self.assertEqual(counts(), [1, 0, 1])
+
+        # 카테고리 변경
+        post_000 = Post.objects.get(pk=post_000.pk)
+        post_000.category = category_001
+        post_000.save()
+        self.assertEqual(counts(), [0, 1, 1])
+
+        post_001.category = category_000
+        post_001.save()
+        self.assertEqual(counts(), [1, 1, 0])
+
+        # 삭제
+        post_001.delete()
+        self.assertEqual(counts(), [0, 1, 0])
+
+        # 카테고리 삭제 -> 미분류로 이동
+        category_001.delete()
+        self.assertEqual(counts(), [0, 1])
+
+    def test_markdown_content_stored(self):
+        post_000 = create_post(
+            title='first post',
+            content='# we are the world',
+            author=self.author_000,
+        )
+        comment_000 = create_comment(post_000, text='**bold** comment')
+
+        # 저장할 때 렌더링된 HTML이 같이 저장된다
+        post_000 = Post.objects.get(pk=post_000.pk)
+        self.assertIn('<h1>we are the world</h1>', post_000.content_html)
+        comment_000 = Comment.objects.get(pk=comment_000.pk)
+        self.assertIn('<strong>bold</strong>', comment_000.text_html)
+
+        # 목록용 excerpt는 태그 없는 텍스트로 저장된다
+        self.assertEqual(post_000.excerpt, 'we are the world')
+        long_post = create_post(
+            title='long post',
+            content='**' + ' '.join(['word'] * 100) + '** & more',
+            author=self.author_000,
+        )
+        self.assertNotIn('<', long_post.excerpt)
+        self.assertEqual(len(long_post.excerpt.split()), 50)
+        self.assertTrue(long_post.excerpt.endswith('…'))
+
+        # 렌더러 버전이 바뀌면 접근할 때 다시 렌더링해서 저장한다
+        Post.objects.filter(pk=post_000.pk).update(content_html='stale', content_html_version=0)
+        post_000 = Post.objects.get(pk=post_000.pk)
+        self.assertIn('<h1>we are the world</h1>', post_000.get_markdown_content())
+        self.assertEqual(Post.objects.get(pk=post_000.pk).content_html, post_000.content_html)
+        Post.objects.filter(pk=post_000.pk).update(excerpt='', content_html_version=0)
+        self.assertEqual(Post.objects.get(pk=post_000.pk).get_excerpt(), 'we are the world')
+
 
 class TestView(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.author_000 = User.objects.create_user(username='smith', password='nopassword')
         self.user_obama = User.objects.create_user(username='obama', password='nopassword')
@@ -243,40 +328,72 @@ class TestView(TestCase):
 
         #category
         self.assertIn(category_politics.name, main_div.text)
-        #edit x (로그인x)
-        self.assertNotIn('EDIT', main_div.text)
-        
-        #로그인
-        #edit > post.author == 로그인 사용자
-        login_success = self.client.login(username='smith', password='nopassword')
-        self.assertTrue(login_success)
-        response = self.client.get(post_000.get_absolute_url())
-        self.assertEqual(response.status_code, 200)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        main_div = soup.find('div', id='main-div')
+        #edit 버튼은 숨겨져 있고 작성자에게만 보인다 (user-state.js)
+        edit_button = main_div.find('button', attrs={'data-owner-id': str(post_000.author.pk)})
+        self.assertIn('EDIT', edit_button.text)
+        self.assertIn('d-none', edit_button['class'])
 
-        self.assertEqual(post_000.author, self.author_000)
-        self.assertIn('EDIT', main_div.text)
+        comments_div = main_div.find('div', id='comment-list')
+        comment_000_div = comments_div.find('div', id='comment-id-{}'.format(comment_000.pk))
+        owner_span = comment_000_div.find(attrs={'data-owner-id': str(comment_000.author.pk)})
+        self.assertIn('d-none', owner_span['class'])
+        self.assertIn('edit', owner_span.text)
+        self.assertIn('delete', owner_span.text)
 
-        #edit x > post.author != 로그인 사용자
+        #로그인해도 같은 HTML
         login_success = self.client.login(username='obama', password='nopassword')
         self.assertTrue(login_success)
-        response = self.client.get(post_000.get_absolute_url())
-        self.assertEqual(response.status_code, 200)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        main_div = soup.find('div', id='main-div')
-
-        self.assertNotEqual(post_000.author, self.user_obama)
-        self.assertNotIn('EDIT', main_div.text)
-
-        comments_div = main_div.find('div', id='comment-list')
-        comment_000_div = comments_div.find('div', id='comment-id-{}'.format(comment_000.pk))
-        self.assertIn('edit', comment_000_div.text)
-        self.assertIn('delete', comment_000_div.text)
+        logged_in = self.client.get(post_000.get_absolute_url())
+        self.assertEqual(logged_in.content, response.content)
 
+        # 다른 사용자의 댓글 버튼도 숨겨진 채로 내려가고 작성자만 user-state.js가 보여준다
         comment_001_div = comments_div.find('div', id='comment-id-{}'.format(comment_001.pk))
-        self.assertNotIn('edit', comment_001_div.text)
-        self.assertNotIn('delete', comment_001_div.text)
+        owner_span = comment_001_div.find(attrs={'data-owner-id': str(comment_001.author.pk)})
+        self.assertIn('d-none', owner_span['class'])
+        self.assertIn('edit', owner_span.text)
+        self.assertNotEqual(owner_span['data-owner-id'], str(self.user_obama.pk))
+
+    @override_settings(BLOG_POSTS_PER_PAGE=3)
+    def test_post_list_pagination(self):
+        category_politics = create_category(name='정치/사회')
+        posts = [
+            create_post(
+                title='post {}'.format(i),
+                content='content {}'.format(i),
+                author=self.author_000,
+                category=category_politics,
+            )
+            for i in range(7)
+        ]
+        tag_america = create_tag(name='america')
+        for p in posts:
+            p.tags.add(tag_america)
+        titles = [p.title for p in reversed(posts)] # 최신 글이 먼저
+
+        for url in ['/blog/', category_politics.get_absolute_url(), tag_america.get_absolute_url()]:
+            seen = []
+            links = []
+            next_url = url
+            while next_url:
+                response = self.client.get(next_url)
+                self.assertEqual(response.status_code, 200)
+                soup = BeautifulSoup(response.content, 'html.parser')
+                seen += [h.text for h in soup.find_all('h2', class_='card-title')]
+                links.append(next_url)
+                older = soup.find('a', id='page-older')
+                next_url = url + older['href'] if older else None
+
+            self.assertEqual(seen, titles)
+            self.assertEqual(len(links), 3)
+
+            # 마지막 페이지에서 Newer 링크로 돌아가면 두번째 페이지와 같아야 함
+            newer = soup.find('a', id='page-newer')
+            response = self.client.get(url + newer['href'])
+            soup = BeautifulSoup(response.content, 'html.parser')
+            self.assertEqual([h.text for h in soup.find_all('h2', class_='card-title')], titles[3:6])
+
+        response = self.client.get('/blog/?after=broken')
+        self.assertEqual(response.status_code, 404)
 
     def test_post_list_by_category(self):
         category_politics = create_category(name='정치/사회')
@@ -360,6 +477,48 @@ class TestView(TestCase):
         self.assertNotIn(post_001.title, main_div.text)
 
 
+    def test_search(self):
+        tag_america = create_tag(name='america')
+        post_000 = create_post(
+            title='first post',
+            content='we are the world',
+            author=self.author_000,
+        )
+        post_001 = create_post(
+            title='world peace',
+            content='story about Steve Jobs',
+            author=self.author_000,
+        )
+        post_002 = create_post(
+            title='한라 소식',
+            content='청주시 옥산면 공장 이야기',
+            author=self.author_000,
+        )
+        post_002.tags.add(tag_america)
+
+        def search(q):
+            jobs.run_pending() # 색인은 작업 큐에서 갱신된다
+            response = self.client.get('/blog/search/', {'q': q})
+            self.assertEqual(response.status_code, 200)
+            soup = BeautifulSoup(response.content, 'html.parser')
+            return [h.text for h in soup.find_all('h2', class_='card-title')]
+
+        # 제목에 있는 단어가 본문에 있는 것보다 먼저 나온다
+        self.assertEqual(search('world'), [post_001.title, post_000.title])
+        self.assertEqual(search('jobs'), [post_001.title])
+        self.assertEqual(search('옥산'), [post_002.title])
+        self.assertEqual(search('america'), [post_002.title]) # tag
+        self.assertEqual(search('"unbalanced OR'), [])
+
+        # 수정/삭제가 바로 반영된다
+        post_000.content = 'we are the champions'
+        post_000.save()
+        self.assertEqual(search('world'), [post_001.title])
+        post_001.delete()
+        self.assertEqual(search('world'), [])
+        post_002.tags.remove(tag_america)
+        self.assertEqual(search('america'), [])
+
     def test_post_update(self):
         post_000 = create_post(
             title='first post', 
@@ -412,3 +571,1378 @@ class TestView(TestCase):
         main_div = soup.find('div', id='main-div')
         self.assertIn(post_000.title, main_div.text)
         self.assertIn('A first Test', main_div.text)
+
+
+class TestPageCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.category = create_category(name='정치/사회')
+        self.tag = create_tag(name='america')
+        self.post_000 = create_post(
+            title='first post',
+            content='we are the world',
+            author=self.author_000,
+            category=self.category,
+        )
+        self.post_000.tags.add(self.tag)
+        self.post_001 = create_post(
+            title='second post',
+            content='second second seoncd',
+            author=self.author_000,
+        )
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def assertCached(self, url, cached=True):
+        response, num_queries = self.get(url)
+        # 캐시된 페이지는 ETag 계산용 ChangeMarker 조회 하나만 한다
+        if cached:
+            self.assertEqual(num_queries, 1, url)
+        else:
+            self.assertGreater(num_queries, 1, url)
+        return response
+
+    def test_anonymous_pages_cached(self):
+        urls = [
+            '/',
+            '/main/',
+            '/blog/',
+            self.post_000.get_absolute_url(),
+            self.tag.get_absolute_url(),
+            self.category.get_absolute_url(),
+            '/blog/category/_none/',
+        ]
+        for url in urls:
+            self.assertCached(url, cached=False)
+        for url in urls:
+            self.assertCached(url)
+
+    def test_invalidation(self):
+        detail_000 = self.post_000.get_absolute_url()
+        detail_001 = self.post_001.get_absolute_url()
+        for url in [detail_000, detail_001, '/blog/', self.tag.get_absolute_url()]:
+            self.get(url)
+
+        # 댓글은 해당 게시물 상세 페이지와 (댓글 수가 보이는) 목록을 바꾼다
+        create_comment(self.post_000, text='new comment', author=self.author_000)
+        response = self.assertCached(detail_000, cached=False)
+        self.assertIn('new comment', response.content.decode())
+        self.assertCached(detail_001)
+        self.assertCached('/blog/', cached=False)
+
+        # 게시물 수정은 목록과 태그 목록에 반영된다
+        self.post_000.title = 'edited title'
+        self.post_000.save()
+        self.assertIn('edited title', self.assertCached('/blog/', cached=False).content.decode())
+        self.assertIn('edited title', self.assertCached(self.tag.get_absolute_url(), cached=False).content.decode())
+        self.assertCached(detail_001)
+
+        # 태그 제거
+        self.post_000.tags.remove(self.tag)
+        self.assertNotIn('edited title', self.assertCached(self.tag.get_absolute_url(), cached=False).content.decode())
+
+        # 카테고리 이름은 sidebar에 보이므로 모든 페이지가 바뀐다
+        self.category.name = '경제'
+        self.category.save()
+        self.assertIn('경제', self.assertCached(detail_001, cached=False).content.decode())
+
+    def test_authenticated_shared(self):
+        # 사용자별 내용이 없으므로 로그인한 사용자도 같은 캐시를 쓴다
+        self.assertCached(self.post_000.get_absolute_url(), cached=False)
+        self.client.login(username='smith', password='nopassword')
+        response = self.assertCached(self.post_000.get_absolute_url())
+        # CSRF 토큰은 비어 있다 (user-state.js가 채움)
+        self.assertContains(response, '<input type="hidden" name="csrfmiddlewaretoken" value="">', html=True)
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.post_000 = create_post(
+            title='first post',
+            content='we are the world',
+            author=self.author_000,
+        )
+        self.post_001 = create_post(
+            title='second post',
+            content='second second seoncd',
+            author=self.author_000,
+        )
+
+    def test_etag(self):
+        url = self.post_000.get_absolute_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+        # 다른 게시물의 댓글은 영향을 주지 않는다
+        create_comment(self.post_001, text='other comment', author=self.author_000)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # 이 게시물의 댓글은 ETag를 바꾼다
+        create_comment(self.post_000, text='new comment', author=self.author_000)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified(self):
+        # Last-Modified는 초 단위이므로 기존 변경이 몇 초 전에 있었던 것으로 만든다
+        ChangeMarker.objects.update(changed=F('changed') - timedelta(seconds=10))
+        response = self.client.get('/blog/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get('/blog/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # 수정하면 updated가 바뀌고 목록도 다시 내려받는다
+        updated = self.post_000.updated
+        self.post_000.title = 'edited title'
+        self.post_000.save()
+        self.assertGreater(self.post_000.updated, updated)
+        response = self.client.get('/blog/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('edited title', response.content.decode())
+
+    def test_seeded_markers(self):
+        # 배포 전부터 있던 게시물도 touch되기 전에 Last-Modified를 받는다 (migration 0021)
+        from importlib import import_module
+        from django.apps import apps
+
+        tag = create_tag(name='america')
+        self.post_000.tags.add(tag)
+        ChangeMarker.objects.all().delete()
+        self.assertFalse(self.client.get(self.post_000.get_absolute_url()).has_header('Last-Modified'))
+        import_module('blog.migrations.0021_seed_change_markers').seed_change_markers(apps, None)
+        for url in (self.post_000.get_absolute_url(), '/blog/', tag.get_absolute_url(), '/blog/category/_none/'):
+            self.assertTrue(self.client.get(url).has_header('Last-Modified'), url)
+
+    def test_public(self):
+        url = self.post_000.get_absolute_url()
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=60', response['Cache-Control'])
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+        # 로그인한 사용자도 같은 ETag이고 session을 읽지 않는다
+        self.client.login(username='smith', password='nopassword')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url)
+        self.assertEqual(response['ETag'], etag)
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_user_state(self):
+        response = self.client.get('/blog/me/')
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(response.json(), {'authenticated': False, 'id': None, 'username': None, 'csrf_token': None})
+
+        self.client.login(username='smith', password='nopassword')
+        response = self.client.get('/blog/me/')
+        self.assertIn('private', response['Cache-Control'])
+        state = response.json()
+        self.assertTrue(state['authenticated'])
+        self.assertEqual(state['id'], self.author_000.pk)
+        self.assertEqual(state['username'], 'smith')
+        self.assertTrue(state['csrf_token'])
+
+        # 받은 토큰으로 댓글을 쓸 수 있다
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='smith', password='nopassword')
+        token = client.get('/blog/me/').json()['csrf_token']
+        response = client.post(self.post_000.get_absolute_url() + 'new_comment/', {'text': 'hello'})
+        self.assertEqual(response.status_code, 403)
+        response = client.post(
+            self.post_000.get_absolute_url() + 'new_comment/',
+            {'text': 'hello', 'csrfmiddlewaretoken': token},
+        )
+        self.assertEqual(response.status_code, 302)
+
+
+class TestSurrogatePurge(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.receiver = PurgeReceiver().start()
+        self.settings_override = override_settings(BLOG_PURGE_URL=self.receiver.url)
+        self.settings_override.enable()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.category = create_category(name='정치/사회')
+        self.tag = create_tag(name='america')
+        self.post_000 = create_post(
+            title='first post',
+            content='we are the world',
+            author=self.author_000,
+            category=self.category,
+        )
+        self.post_000.tags.add(self.tag)
+        # setUp에서 생긴 purge 작업은 실행 전에 지운다 (setUp이 느리면 run_pending에서 먼저 보내질 수 있음)
+        Job.objects.filter(name='cdn.purge').delete()
+        jobs.run_pending()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.receiver.stop()
+
+    def test_surrogate_key_header(self):
+        response = self.client.get(self.post_000.get_absolute_url())
+        self.assertEqual(response['Surrogate-Key'], 'post:{} sidebar'.format(self.post_000.pk))
+        # 304에도 붙는다
+        response = self.client.get(self.post_000.get_absolute_url(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('sidebar', response['Surrogate-Key'])
+
+        response = self.client.get(self.category.get_absolute_url())
+        self.assertIn(surrogate_key('category:정치사회'), response['Surrogate-Key'].split())
+        self.assertTrue(response['Surrogate-Key'].isascii())
+
+    def test_batched_purge(self):
+        # 여러 변경이 대기중인 purge 작업 하나에 모인다
+        self.post_000.title = 'edited title'
+        self.post_000.save()
+        create_comment(self.post_000, text='new comment', author=self.author_000)
+        self.tag.name = 'usa'
+        self.tag.save()
+        self.assertEqual(Job.objects.filter(name='cdn.purge').count(), 1)
+        self.assertEqual(self.receiver.purged, [])
+
+        Job.objects.update(run_after=timezone.now())
+        jobs.run_pending()
+        self.assertEqual(len(self.receiver.purged), 1)
+        self.assertEqual(self.receiver.keys, {
+            'posts',
+            'post:{}'.format(self.post_000.pk),
+            'tag:america',
+            surrogate_key('category:정치사회'),
+        })
+
+    def test_concurrent_merge(self):
+        import json
+        from blog import purge
+
+        purge.queue_purge(['post:1'])
+        job = Job.objects.get(name='cdn.purge')
+        # 다른 요청이 읽고 합치는 사이에 key를 더한 경우
+        loads = purge.json.loads
+        def loads_then_race(payload):
+            data = loads(payload)
+            if 'post:2' not in payload:
+                Job.objects.filter(pk=job.pk).update(payload=json.dumps({'keys': ['post:1', 'post:2']}))
+            return data
+
+        purge.json.loads = loads_then_race
+        try:
+            purge.queue_purge(['post:3'])
+        finally:
+            purge.json.loads = loads
+        job.refresh_from_db()
+        self.assertEqual(json.loads(job.payload)['keys'], ['post:1', 'post:2', 'post:3'])
+
+        # worker가 가져간 뒤에는 새 작업
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING)
+        purge.queue_purge(['post:4'])
+        pending = Job.objects.get(name='cdn.purge', status=Job.PENDING)
+        self.assertEqual(json.loads(pending.payload)['keys'], ['post:4'])
+
+    @override_settings(BLOG_PURGE_BATCH_SIZE=2, BLOG_PURGE_HEADERS={'Fastly-Key': 'secret'})
+    def test_batch_size(self):
+        self.post_000.tags.remove(self.tag)
+        Job.objects.update(run_after=timezone.now())
+        jobs.run_pending()
+        self.assertTrue(all(len(batch) <= 2 for batch in self.receiver.purged))
+        self.assertIn('tag:america', self.receiver.keys)
+        self.assertEqual(self.receiver.headers[0]['Fastly-Key'], 'secret')
+
+    def test_failed_purge_retried(self):
+        self.receiver.status = 503
+        pk = self.post_000.pk
+        self.post_000.delete()
+        Job.objects.update(run_after=timezone.now())
+        jobs.run_pending()
+        job = Job.objects.get(name='cdn.purge')
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertIn('HTTPError', job.last_error)
+
+        self.receiver.status = 200
+        Job.objects.update(run_after=timezone.now())
+        jobs.run_pending()
+        self.assertIn('post:{}'.format(pk), self.receiver.keys)
+        self.assertFalse(Job.objects.filter(name='cdn.purge').exists())
+
+    @override_settings(BLOG_PURGE_URL='')
+    def test_disabled(self):
+        self.post_000.save()
+        self.assertFalse(Job.objects.filter(name='cdn.purge').exists())
+
+
+class TestCommentStats(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.post_000 = create_post(title='first post', content='we are the world', author=self.author_000)
+        self.post_001 = create_post(title='second post', content='second second seoncd', author=self.author_000)
+
+    def test_counts_maintained(self):
+        comment_000 = create_comment(self.post_000, text='first', author=self.author_000)
+        comment_001 = create_comment(self.post_000, text='second', author=self.author_000)
+        self.post_000.refresh_from_db()
+        self.assertEqual(self.post_000.comment_count, 2)
+        self.assertEqual(self.post_000.last_comment_at, comment_001.created_at)
+
+        comment_001.delete()
+        self.post_000.refresh_from_db()
+        self.assertEqual(self.post_000.comment_count, 1)
+        self.assertEqual(self.post_000.last_comment_at, comment_000.created_at)
+
+        comment_000.delete()
+        self.post_000.refresh_from_db()
+        self.assertEqual(self.post_000.comment_count, 0)
+        self.assertIsNone(self.post_000.last_comment_at)
+
+        # 목록 카드의 댓글 수도 바로 바뀐다
+        self.client.get('/blog/')
+        create_comment(self.post_001, text='hello', author=self.author_000)
+        soup = BeautifulSoup(self.client.get('/blog/').content, 'html.parser')
+        self.assertIn('댓글 1', soup.find(id='comment-count-{}'.format(self.post_001.pk)).text)
+
+    def test_cascade_delete(self):
+        comments = [Comment(post=self.post_000, text='comment {}'.format(i), author=self.author_000) for i in range(50)]
+        Comment.objects.bulk_create(comments)
+        self.client.get('/blog/')
+        # 게시물과 같이 지워지는 댓글마다 통계 갱신, 무효화를 하지 않는다 (게시물 삭제에서 한번)
+        with CaptureQueriesContext(connection) as queries:
+            self.post_000.delete()
+        self.assertLess(len(queries), 20)
+        self.assertNotContains(self.client.get('/blog/'), 'first post')
+
+        # 따로 지우는 댓글은 그대로 반영된다
+        comment = create_comment(self.post_001, text='hello', author=self.author_000)
+        comment.delete()
+        self.post_001.refresh_from_db()
+        self.assertEqual(self.post_001.comment_count, 0)
+
+    def test_reconcile(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        comment = create_comment(self.post_000, text='first', author=self.author_000)
+        Post.objects.filter(pk=self.post_000.pk).update(comment_count=7, last_comment_at=None)
+        Post.objects.filter(pk=self.post_001.pk).update(comment_count=3)
+
+        out = StringIO()
+        call_command('reconcile_comment_stats', stdout=out)
+        self.assertIn('2 posts fixed', out.getvalue())
+        self.post_000.refresh_from_db()
+        self.post_001.refresh_from_db()
+        self.assertEqual((self.post_000.comment_count, self.post_000.last_comment_at), (1, comment.created_at))
+        self.assertEqual((self.post_001.comment_count, self.post_001.last_comment_at), (0, None))
+
+        out = StringIO()
+        call_command('reconcile_comment_stats', stdout=out)
+        self.assertIn('0 posts fixed', out.getvalue())
+
+    def test_sort(self):
+        create_post(title='third post', content='third', author=self.author_000)
+        for text in ('a', 'b'):
+            create_comment(self.post_000, text=text, author=self.author_000)
+        create_comment(self.post_001, text='c', author=self.author_000)
+
+        def titles(url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return [p.title for p in response.context['object_list']]
+
+        self.assertEqual(titles('/blog/'), ['third post', 'second post', 'first post'])
+        self.assertEqual(titles('/blog/?sort=discussed'), ['first post', 'second post', 'third post'])
+        # 댓글이 없는 게시물은 최근 댓글 순 목록에 나오지 않는다
+        self.assertEqual(titles('/blog/?sort=active'), ['second post', 'first post'])
+        self.assertEqual(self.client.get('/blog/?sort=unknown').status_code, 404)
+
+        # 정렬 순서대로 keyset 페이지가 이어진다
+        cache.clear()
+        with override_settings(BLOG_POSTS_PER_PAGE=1):
+            response = self.client.get('/blog/?sort=discussed')
+            self.assertEqual([p.title for p in response.context['object_list']], ['first post'])
+            self.assertEqual(titles('/blog/' + response.context['page_obj'].next_link), ['second post'])
+
+
+@override_settings(BLOG_RELATED_TITLE_WEIGHT=0)
+class TestRelatedPosts(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.tags = {name: create_tag(name=name) for name in ('fern', 'moss', 'cactus', 'orchid')}
+        self.posts = {}
+        for title, tags in (('a', 'fern moss'), ('b', 'fern moss'), ('c', 'fern'), ('d', 'orchid'), ('e', 'cactus')):
+            post = create_post(title=title, content='content', author=self.author_000)
+            post.tags.add(*[self.tags[name] for name in tags.split()])
+            self.posts[title] = post
+        jobs.run_pending()
+
+    def related(self, title):
+        return [post.title for post in related.related_posts(self.posts[title])]
+
+    def test_rebuild(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        self.assertEqual(self.related('a'), ['b', 'c'])
+        self.assertEqual(self.related('c'), ['b', 'a'])
+        # 혼자 가진 태그로는 관련이 생기지 않는다
+        self.assertEqual(self.related('d'), [])
+
+        RelatedPost.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_related_posts', stdout=out)
+        self.assertIn('3 posts changed', out.getvalue())
+        self.assertEqual(self.related('a'), ['b', 'c'])
+        self.assertEqual(related.rebuild(), [])
+
+        with override_settings(BLOG_RELATED_POSTS=1):
+            related.rebuild()
+        self.assertEqual(self.related('a'), ['b'])
+
+    def test_incremental(self):
+        # 태그가 바뀐 게시물과 순위가 바뀌는 게시물만 다시 계산된다
+        self.posts['e'].tags.add(self.tags['fern'], self.tags['moss'])
+        jobs.run_pending()
+        self.assertEqual(self.related('e'), ['b', 'a', 'c'])
+        self.assertIn('e', self.related('a'))
+
+        self.posts['a'].tags.clear()
+        jobs.run_pending()
+        self.assertEqual(self.related('a'), [])
+        self.assertNotIn('a', self.related('b'))
+        # 전체를 다시 만든 것과 같다
+        self.assertEqual(related.rebuild(), [])
+
+        # 지워진 게시물의 자리는 다시 채워진다
+        self.posts['b'].delete()
+        jobs.run_pending()
+        self.assertEqual(self.related('e'), ['c'])
+        self.assertEqual(self.related('c'), ['e'])
+
+        # 태그를 지우면 그 태그가 있던 게시물도 다시 계산
+        self.tags['fern'].delete()
+        jobs.run_pending()
+        self.assertEqual(self.related('c'), [])
+
+    def test_incremental_matches_rebuild(self):
+        import random
+
+        rng = random.Random(0)
+        tags = list(self.tags.values()) + [create_tag(name='tag{}'.format(i)) for i in range(4)]
+        posts = list(self.posts.values()) + [
+            create_post(title='post {}'.format(i), content='content', author=self.author_000) for i in range(20)
+        ]
+        for post in posts:
+            post.tags.set(rng.sample(tags, rng.randint(0, 4)))
+        jobs.run_pending()
+        related.rebuild()
+
+        # 게시물 수가 그대로면 태그를 바꿀 때마다 전체를 다시 만든 것과 같다
+        for step in range(20):
+            rng.choice(posts).tags.set(rng.sample(tags, rng.randint(0, 4)))
+            jobs.run_pending()
+            self.assertEqual(related.rebuild(), [], 'step {}'.format(step))
+        rng.choice(tags).post_set.set(rng.sample(posts, 6))
+        jobs.run_pending()
+        self.assertEqual(related.rebuild(), [])
+
+        # 게시물 수가 바뀌면 잠시 뒤 전체를 다시 만든다
+        rebuild_job = Job.objects.get(key='related:rebuild', status=Job.PENDING)
+        self.assertGreater(rebuild_job.run_after, timezone.now())
+
+    def test_candidates(self):
+        # 바뀐 게시물과 태그를 같이 가진 게시물만 불러온다
+        index = related.SimilarityIndex.build([self.posts['c'].pk])
+        self.assertEqual(set(index.vectors), {self.posts[title].pk for title in 'abc'})
+        self.assertEqual(set(related.SimilarityIndex.build([self.posts['d'].pk]).vectors), {self.posts['d'].pk})
+        # 점수는 전체로 만든 것과 같다
+        full = related.SimilarityIndex.build()
+        self.assertEqual(index.neighbours(self.posts['c'].pk), full.neighbours(self.posts['c'].pk))
+
+    def test_title_terms(self):
+        # 제목 단어는 태그를 같이 가진 게시물들의 순위만 바꾼다
+        titles = ('repot orchid', 'orchid bloom', 'new soil')
+        new_posts = [create_post(title=title, content='content', author=self.author_000) for title in titles]
+        for post in new_posts:
+            post.tags.add(self.tags['cactus'])
+        with override_settings(BLOG_RELATED_TITLE_WEIGHT=0.5):
+            jobs.run_pending()
+            self.assertEqual(related.related_posts(new_posts[0])[0], new_posts[1])
+        # 제목 없이는 점수가 같으므로 최근 게시물이 먼저
+        related.rebuild()
+        self.assertEqual(related.related_posts(new_posts[0])[0], new_posts[2])
+
+    def test_detail_page(self):
+        url = self.posts['a'].get_absolute_url()
+        response = self.client.get(url)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        related_area = soup.find('div', id='related-posts')
+        self.assertEqual(
+            [li['id'] for li in related_area.find_all('li')],
+            ['related-post-{}'.format(self.posts['b'].pk), 'related-post-{}'.format(self.posts['c'].pk)],
+        )
+        # 관련 게시물은 쿼리 한번
+        with CaptureQueriesContext(connection) as queries:
+            list(related.related_posts(self.posts['a']))
+        self.assertEqual(len(queries), 1)
+        self.assertIn('blog_relatedpost', queries[0]['sql'])
+
+        # 목록이 바뀌면 캐시된 상세 페이지도 바뀐다
+        self.client.get(url)
+        self.posts['c'].tags.add(self.tags['moss'])
+        self.posts['c'].title = 'renamed'
+        self.posts['c'].save()
+        jobs.run_pending()
+        self.assertContains(self.client.get(url), 'renamed')
+
+        self.assertNotContains(self.client.get(self.posts['e'].get_absolute_url()), 'id="related-posts"')
+
+
+class TestMarkdownPreview(TestCase):
+    url = '/markdownx/markdownify/'
+
+    def setUp(self):
+        from . import preview
+
+        self.preview = preview
+        cache.clear()
+        preview.rendered.clear()
+        preview.editors.clear()
+
+    def test_cache(self):
+        response = self.client.post(self.url, {'content': '# hello'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Preview-Cache'], 'miss')
+        self.assertIn('<h1>hello</h1>', response.content.decode())
+
+        response = self.client.post(self.url, {'content': '# hello'})
+        self.assertEqual(response['X-Preview-Cache'], 'hit')
+        self.assertIn('<h1>hello</h1>', response.content.decode())
+        self.assertEqual(self.client.post(self.url, {'content': '# bye'})['X-Preview-Cache'], 'miss')
+
+    @override_settings(BLOG_PREVIEW_RATE=(2, 60))
+    def test_rate_limit(self):
+        self.client.post(self.url, {'content': 'one'})
+        self.client.post(self.url, {'content': 'two'})
+        response = self.client.post(self.url, {'content': 'three'})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) > 0)
+        # 편집기의 미리보기가 비지 않도록 마지막 결과를 준다
+        self.assertIn('two', response.content.decode())
+
+        # 캐시된 내용과 다른 사용자는 제한되지 않는다
+        self.assertEqual(self.client.post(self.url, {'content': 'one'}).status_code, 200)
+        self.assertEqual(self.client.post(self.url, {'content': 'three'}, REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_superseded(self):
+        import threading
+        import time
+
+        state = self.preview.editor_state('ip:127.0.0.1')
+        state.last_html = '<p>old</p>'
+        responses = {}
+
+        def post(content):
+            responses[content] = Client().post(self.url, {'content': content})
+
+        def wait_for(number):
+            for _ in range(500):
+                if state.latest >= number:
+                    return
+                time.sleep(0.01)
+
+        # 앞선 렌더링이 진행중인 동안 두 요청이 들어온다
+        state.render_lock.acquire()
+        first = threading.Thread(target=post, args=('first',))
+        first.start()
+        wait_for(1)
+        second = threading.Thread(target=post, args=('second',))
+        second.start()
+        wait_for(2)
+        state.render_lock.release()
+        first.join()
+        second.join()
+
+        # 기다리던 요청은 렌더링하지 않고 마지막 결과(순서에 따라 old 또는 second)를 받는다
+        self.assertEqual(responses['first']['X-Preview-Cache'], 'superseded')
+        self.assertIn(responses['first'].content.decode(), ['<p>old</p>', '<p>second</p>'])
+        self.assertNotIn(self.preview.content_key('first'), self.preview.rendered)
+        self.assertEqual(responses['second']['X-Preview-Cache'], 'miss')
+        self.assertIn('second', responses['second'].content.decode())
+
+
+class MediaRootMixin:
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def make_image(self, width, height):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'green').save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class TestImageDerivatives(MediaRootMixin, TestCase):
+    def test_derivatives(self):
+        post_000 = Post.objects.create(
+            title='first post',
+            content='we are the world',
+            author=self.author_000,
+            head_image=self.make_image(1000, 500),
+        )
+        self.assertEqual(Post.objects.get(pk=post_000.pk).get_head_image_widths(), [])
+        self.assertEqual(jobs.run_pending(), 3) # 검색 색인 + 이미지 + 관련 게시물
+        post_000 = Post.objects.get(pk=post_000.pk)
+        self.assertEqual(post_000.get_head_image_widths(), [400, 750])
+
+        root, _ = os.path.splitext(post_000.head_image.path)
+        with Image.open(root + '.400w.jpg') as image:
+            self.assertEqual(image.size, (400, 200))
+            self.assertNotIn('exif', image.info)
+        self.assertTrue(os.path.exists(root + '.750w.webp'))
+
+        response = self.client.get(post_000.get_absolute_url())
+        soup = BeautifulSoup(response.content, 'html.parser')
+        picture = soup.find('div', id='main-div').find('picture')
+        self.assertIn('.400w.webp 400w', picture.find('source')['srcset'])
+        self.assertIn('.750w.jpg 750w', picture.find('img')['srcset'])
+
+        # 이미지를 바꾸면 이전 파생 이미지는 지워진다
+        post_000.head_image = self.make_image(300, 300)
+        post_000.save()
+        jobs.run_pending()
+        post_000 = Post.objects.get(pk=post_000.pk)
+        self.assertEqual(post_000.get_head_image_widths(), [300])
+        self.assertFalse(os.path.exists(root + '.400w.jpg'))
+
+    def test_command_invalidates_pages(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        post_000 = Post.objects.create(
+            title='first post',
+            content='we are the world',
+            author=self.author_000,
+            head_image=self.make_image(1000, 500),
+        )
+        Job.objects.all().delete()
+        # 작업 대신 명령으로 만든다. 그 전에 캐시된 페이지에는 크기별 이미지가 없다
+        self.assertNotIn(b'srcset', self.client.get(post_000.get_absolute_url()).content)
+        self.assertNotIn(b'srcset', self.client.get('/blog/').content)
+
+        call_command('generate_image_derivatives', stdout=StringIO())
+        self.assertIn(b'.400w.webp 400w', self.client.get(post_000.get_absolute_url()).content)
+        self.assertIn(b'.400w.webp 400w', self.client.get('/blog/').content)
+
+    def test_legacy_original(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        # hash 이름이 아닌 예전 원본도 크기별 이미지는 원본 옆에 같은 규칙의 이름으로 만든다
+        name = 'blog/2020/08/01/photo.jpg'
+        os.makedirs(os.path.join(self.media_root, os.path.dirname(name)))
+        with open(os.path.join(self.media_root, name), 'wb') as f:
+            f.write(self.make_image(1000, 500).read())
+        post_000 = Post.objects.create(title='first post', content='we are the world', author=self.author_000)
+        Post.objects.filter(pk=post_000.pk).update(head_image=name)
+        Job.objects.all().delete()
+
+        call_command('generate_image_derivatives', stdout=StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'blog/2020/08/01/photo.400w.webp')))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'blog/2020/08/01/photo.750w.jpg')))
+
+        soup = BeautifulSoup(self.client.get(post_000.get_absolute_url()).content, 'html.parser')
+        picture = soup.find('div', id='main-div').find('picture')
+        urls = [
+            candidate.split()[0]
+            for srcset in (picture.find('source')['srcset'], picture.find('img')['srcset'])
+            for candidate in srcset.split(', ')
+        ]
+        self.assertIn('/media/blog/2020/08/01/photo.400w.webp', urls)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+calls = []
+
+@jobs.job('test.record')
+def record_job(value, fail_times=0):
+    calls.append(value)
+    if calls.count(value) <= fail_times:
+        raise ValueError('fail')
+
+
+class TestMediaStorage(MediaRootMixin, TestCase):
+    def create_post(self, title, head_image=None, content='we are the world'):
+        post = Post.objects.create(title=title, content=content, author=self.author_000, head_image=head_image)
+        jobs.run_pending()
+        return Post.objects.get(pk=post.pk)
+
+    def test_content_addressed(self):
+        from hallaplantproject.storage import is_content_addressed
+
+        post_000 = self.create_post('first post', self.make_image(1000, 500))
+        post_001 = self.create_post('second post', self.make_image(1000, 500))
+        name = post_000.head_image.name
+        self.assertTrue(name.startswith(datetime.now().strftime('blog/%Y/%m/%d/')))
+        self.assertTrue(is_content_addressed(name))
+        # 크기별 이미지는 원본의 hash를 쓰고 설정을 바꾸면 같은 이름으로 다시 만들어진다
+        root, _ = os.path.splitext(name)
+        self.assertFalse(is_content_addressed(root + '.400w.webp'))
+        # 같은 내용은 한번만 저장되고 크기별 이미지도 같이 쓴다
+        self.assertEqual(post_001.head_image.name, name)
+        self.assertEqual(post_001.get_head_image_widths(), [400, 750])
+        self.assertEqual(len(os.listdir(os.path.dirname(post_000.head_image.path))), 5)
+
+        # 한쪽 이미지를 바꿔도 다른 게시물이 쓰는 파생 이미지는 남는다
+        post_001.head_image = self.make_image(300, 300)
+        post_001.save()
+        jobs.run_pending()
+        root, _ = os.path.splitext(post_000.head_image.path)
+        self.assertTrue(os.path.exists(root + '.400w.jpg'))
+
+    def test_date_path_per_upload(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        name = default_storage.save('markdownx/%Y/%m/%d/upload.PNG', ContentFile(b'png bytes'))
+        self.assertTrue(name.startswith(datetime.now().strftime('markdownx/%Y/%m/%d/')))
+        self.assertTrue(name.endswith('.png'))
+        # 다른 날, 다른 이름으로 올려도 같은 파일
+        self.assertEqual(default_storage.save('markdownx/2020/01/01/other.png', ContentFile(b'png bytes')), name)
+
+    def test_immutable_url(self):
+        from django.test import RequestFactory
+        from hallaplantproject.media import serve_media
+
+        post_000 = self.create_post('first post', self.make_image(1000, 500))
+        response = serve_media(RequestFactory().get('/'), post_000.head_image.name, document_root=self.media_root)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        os.makedirs(os.path.join(self.media_root, 'old'))
+        with open(os.path.join(self.media_root, 'old', 'photo.jpg'), 'wb') as f:
+            f.write(b'old')
+        response = serve_media(RequestFactory().get('/'), 'old/photo.jpg', document_root=self.media_root)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_hash_media_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from hallaplantproject.storage import is_content_addressed
+
+        # 예전 방식으로 저장된 파일
+        for name, data in [('blog/2020/01/01/photo.jpg', self.make_image(500, 250).read()), ('markdownx/2020/01/01/a.png', b'png')]:
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(data)
+        post_000 = self.create_post('first post', content='![](/media/markdownx/2020/01/01/a.png)')
+        Post.objects.filter(pk=post_000.pk).update(head_image='blog/2020/01/01/photo.jpg')
+        comment_000 = create_comment(post_000, text='![](/media/markdownx/2020/01/01/a.png)', author=self.author_000)
+
+        out = StringIO()
+        call_command('hash_media', '--dry-run', stdout=out)
+        self.assertEqual(Post.objects.get(pk=post_000.pk).head_image.name, 'blog/2020/01/01/photo.jpg')
+
+        call_command('hash_media', stdout=out)
+        self.assertIn('2 files, 1 head images, 1 posts, 1 comments', out.getvalue())
+        post_000 = Post.objects.get(pk=post_000.pk)
+        self.assertTrue(post_000.head_image.name.startswith('blog/2020/01/01/'))
+        self.assertTrue(is_content_addressed(post_000.head_image.name))
+        self.assertNotIn('a.png', post_000.content)
+        self.assertNotIn('a.png', post_000.get_markdown_content())
+        self.assertNotIn('a.png', Comment.objects.get(pk=comment_000.pk).text)
+        self.assertTrue(os.path.exists(post_000.head_image.path))
+
+        # 다시 실행해도 바뀌는 것이 없다
+        out = StringIO()
+        call_command('hash_media', stdout=out)
+        self.assertIn('0 files, 0 head images, 0 posts, 0 comments', out.getvalue())
+
+
+class TestMediaDelivery(MediaRootMixin, TestCase):
+    def setUp(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        super(TestMediaDelivery, self).setUp()
+        self.name = default_storage.save('video/clip.mp4', ContentFile(bytes(range(256)) * 4))
+        self.url = default_storage.url(self.name)
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, content
+
+    def test_full(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, bytes(range(256)) * 4)
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertFalse(response.has_header('Content-Disposition'))
+
+        self.assertEqual(self.client.get('/media/video/none.mp4').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_rewritten_derivative(self):
+        # 크기별 이미지는 같은 이름으로 다시 만들어지므로 캐시 후 확인해야 한다
+        derived = os.path.splitext(self.name)[0] + '.400w.jpg'
+        path = os.path.join(self.media_root, derived)
+        with open(path, 'wb') as f:
+            f.write(b'old quality')
+        self.url = '/media/' + derived
+        response, _ = self.get()
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], '"{}"'.format(os.path.basename(derived)))
+
+        with open(path, 'wb') as f:
+            f.write(b'new quality!')
+        os.utime(path, (os.stat(path).st_mtime + 10,) * 2)
+        response, content = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, content), (200, b'new quality!'))
+
+    def test_conditional(self):
+        response, _ = self.get()
+        not_modified, content = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(content, b'')
+        self.assertIn('immutable', not_modified['Cache-Control'])
+        not_modified, _ = self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_range(self):
+        response, content = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, bytes(range(10, 20)))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+
+        response, content = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(len(content), 24)
+        response, content = self.get(HTTP_RANGE='bytes=-4')
+        self.assertEqual(content, bytes(range(252, 256)))
+
+        response, _ = self.get(HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        # 여러 구간, 바뀐 파일(If-Range)이면 전체
+        response, content = self.get(HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual((response.status_code, len(content)), (200, 1024))
+        response, content = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"other"')
+        self.assertEqual((response.status_code, len(content)), (200, 1024))
+        etag = self.get()[0]['ETag']
+        response, content = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, content), (206, bytes([0, 1])))
+
+    def test_sendfile(self):
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response, content = self.get(HTTP_RANGE='bytes=0-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.name)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response, content = self.get()
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, self.name))
+        self.assertEqual(content, b'')
+
+
+class TestJobs(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        jobs.enqueue('test.record', {'value': 1}, key='record:1')
+        jobs.enqueue('test.record', {'value': 1}, key='record:1') # 대기중인 같은 key는 한번만
+        jobs.enqueue('test.record', {'value': 2})
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_retry_with_backoff(self):
+        job = jobs.enqueue('test.record', {'value': 3, 'fail_times': 5}, max_attempts=2)
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('ValueError', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+
+        # 재시도 시간이 되기 전에는 실행되지 않는다
+        self.assertEqual(jobs.run_pending(), 0)
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(calls, [3, 3])
+
+    def test_claim_once(self):
+        job = jobs.enqueue('test.record', {'value': 4})
+        self.assertEqual(jobs.claim('worker-a').pk, job.pk)
+        self.assertIsNone(jobs.claim('worker-b'))
+
+        # 죽은 worker의 작업은 다시 대기열로
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(600), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(calls, [4])
+
+    def test_worker_lost(self):
+        # worker를 죽이는 작업은 max_attempts번 뒤에 다시 돌리지 않는다
+        job = jobs.enqueue('test.record', {'value': 6}, max_attempts=2)
+        for attempt in (1, 2):
+            self.assertEqual(jobs.claim('worker-a').pk, job.pk)
+            Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+            self.assertEqual(jobs.requeue_stale(600), 1 if attempt == 1 else 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.last_error, jobs.WORKER_LOST)
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(calls, [])
+
+    @override_settings(BLOG_JOBS_EAGER=True)
+    def test_eager(self):
+        self.assertIsNone(jobs.enqueue('test.record', {'value': 5}))
+        self.assertEqual(calls, [5])
+        self.assertEqual(Job.objects.count(), 0)
+
+
+class TestStaticFiles(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TestStaticFiles, cls).setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(STATIC_ROOT=cls.static_root, DEBUG=False)
+        cls.settings_override.enable()
+        from django.core.management import call_command
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.static_root)
+        super(TestStaticFiles, cls).tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_deduplicated_manifest(self):
+        from django.templatetags.static import static
+
+        blog_url = static('blog/bootstrap/bootstrap.min.css')
+        self.assertRegex(blog_url, r'\.[0-9a-f]{12}\.css$')
+        # main 앱의 같은 파일도 같은 주소를 쓴다
+        self.assertEqual(blog_url, static('main/bootstrap/bootstrap.min.css'))
+        self.assertNotEqual(static('blog/assets/js/custom.js'), '/static/blog/assets/js/custom.js')
+
+        name = blog_url[len('/static/'):]
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, name + '.gz')))
+        duplicate = os.path.join(self.static_root, 'main', 'bootstrap', os.path.basename(name))
+        self.assertNotEqual(os.path.join(self.static_root, name), duplicate)
+        self.assertFalse(os.path.exists(duplicate))
+
+        response = self.client.get('/main/')
+        self.assertContains(response, blog_url)
+
+    def test_serve_precompressed(self):
+        import gzip
+        from django.templatetags.static import static
+
+        url = static('blog/bootstrap/bootstrap.min.css')
+        with open(os.path.join(self.static_root, 'blog', 'bootstrap', 'bootstrap.min.css'), 'rb') as f:
+            original = f.read()
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), original)
+
+    def test_unhashed_name_revalidates(self):
+        response = self.client.get('/static/blog/assets/js/custom.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+        response = self.client.get('/static/blog/assets/js/custom.js', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class TestCompression(TestCase):
+    def setUp(self):
+        from hallaplantproject.middleware import compressed_responses
+
+        cache.clear()
+        compressed_responses.clear()
+        self.compressed_responses = compressed_responses
+        self.client = Client()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.post_000 = create_post(
+            title='first post',
+            content='\n\n'.join('paragraph {} of a *long* post'.format(i) for i in range(200)),
+            author=self.author_000,
+        )
+
+    def test_gzip(self):
+        import gzip
+
+        url = self.post_000.get_absolute_url()
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+        # 같은 페이지는 다시 압축하지 않고 보관해 둔 bytes를 쓴다
+        hits = self.compressed_responses.hits
+        again = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(again.content, response.content)
+        self.assertEqual(self.compressed_responses.hits, hits + 1)
+
+        # 약한 ETag로도 304
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(COMPRESSION_MIN_SIZE=10 ** 7)
+    def test_small_response(self):
+        response = self.client.get(self.post_000.get_absolute_url(), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_csrf_response(self):
+        # CSRF 토큰이 들어간 응답은 압축하지 않는다
+        self.client.login(username='smith', password='nopassword')
+        response = self.client.get('/blog/me/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.json()['csrf_token'])
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_lru(self):
+        from hallaplantproject.lru import LRUCache
+
+        lru = LRUCache(max_entries=3, max_size=10)
+        lru.set('a', b'1234')
+        lru.set('b', b'1234')
+        self.assertEqual(lru.get('a'), b'1234')
+        lru.set('c', b'1234') # 크기 초과: 가장 오래 안 쓴 b가 빠진다
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.total_size, 8)
+        lru.set('d', b'x' * 11) # 너무 큰 값은 넣지 않는다
+        self.assertNotIn('d', lru)
+        self.assertEqual((lru.hits, lru.misses), (1, 1))
+
+
+class TestDatabaseRouting(TestCase):
+    def setUp(self):
+        from django.test import RequestFactory
+        from hallaplantproject.middleware import ReplicaMiddleware
+
+        self.factory = RequestFactory()
+        self.seen = []
+        self.view = None
+
+        def get_response(request):
+            self.middleware.process_view(request, self.view, (), {})
+            from django.db import router
+            from django.http import HttpResponse
+
+            self.seen.append((router.db_for_read(Post), router.db_for_write(Post)))
+            return HttpResponse()
+
+        self.middleware = ReplicaMiddleware(get_response)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_route_read_only_views(self):
+        from django.db import router
+        from .views import PostList, PostDetail, PostListByTag, PostListByCategory
+        from main.views import PreviewList
+
+        for view in (PostList, PostDetail, PostListByTag, PostListByCategory, PreviewList):
+            self.view = view.as_view()
+            self.middleware(self.factory.get('/'))
+        self.assertEqual(self.seen, [('replica', 'default')] * 5)
+        # 요청이 끝나면 다시 primary
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+        self.seen.clear()
+        from .views import PostCreate
+        self.view = PostCreate.as_view()
+        self.middleware(self.factory.get('/'))
+        self.assertEqual(self.seen, [('default', 'default')])
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_sticky_after_write(self):
+        from .views import PostDetail
+
+        self.view = PostDetail.as_view()
+        response = self.middleware(self.factory.post('/'))
+        cookie = response.cookies['use_primary']
+        self.assertEqual(cookie['max-age'], 15)
+
+        request = self.factory.get('/')
+        request.COOKIES['use_primary'] = cookie.value
+        self.middleware(request)
+        self.assertEqual(self.seen[-1], ('default', 'default'))
+
+    def test_sticky_skips_page_cache(self):
+        cache.clear()
+        author = User.objects.create_user(username='smith', password='nopassword')
+        create_post(title='first post', content='hello', author=author)
+        self.client.get('/blog/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/blog/')
+        self.assertEqual(len(queries), 1)
+
+        self.client.cookies['use_primary'] = '1'
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/blog/')
+        self.assertGreater(len(queries), 1)
+
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1) # NORMAL
+
+
+class TestBenchmark(TestCase):
+    def test_seed_and_bench(self):
+        from django.core.management import call_command
+        from . import bench, search
+
+        author_000 = User.objects.create_user(username='smith', password='nopassword')
+        post_000 = create_post(title='first post', content='content', author=author_000)
+        post_000.tags.add(create_tag(name='tag 1'))
+        jobs.run_pending()
+        cache.clear()
+        response = self.client.get(post_000.get_absolute_url())
+
+        call_command('seed_blog', users=2, categories=3, tags=5, posts=30, comments=2, verbosity=0)
+        self.assertEqual(Post.objects.count(), 31)
+        # 만든 게시물과 관련 게시물이 바뀐 게시물의 상세 페이지도 바뀐 것으로 표시된다
+        self.assertEqual(
+            ChangeMarker.objects.filter(key__startswith='post:').count(), Post.objects.count()
+        )
+        self.assertNotEqual(self.client.get(post_000.get_absolute_url())['ETag'], response['ETag'])
+        self.assertEqual(User.objects.count(), 3)
+        # signals 없이 넣었으므로 카운터는 마지막에 다시 센다
+        for category in Category.objects.all():
+            self.assertEqual(category.post_count, category.post_set.count())
+        self.assertEqual(
+            Counter.objects.get(name=Counter.POSTS_WITHOUT_CATEGORY).value,
+            Post.objects.filter(category=None).count(),
+        )
+        # created는 여러 날짜에 퍼져 있다
+        self.assertGreater(Post.objects.dates('created', 'day').count(), 10)
+        self.assertTrue(search.search_post_ids('plant', 10))
+
+        result = bench.benchmark(concurrency=1, requests=2, samples=2)
+        self.assertEqual(set(result['urls']), set(bench.url_templates()))
+        self.assertIn('/blog/<int:pk>/', result['urls'])
+        self.assertIn('/main/', result['urls'])
+        self.assertEqual(result['total']['requests'], 2 * len(result['urls']))
+        self.assertEqual(result['total']['errors'], 0)
+        self.assertGreater(result['peak_rss_kb'], 0)
+
+        changes = bench.compare(result, result)
+        self.assertTrue(all(change in (0, None) for _, _, _, _, change in changes))
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0)
+class TestMetrics(TestCase):
+    def setUp(self):
+        from hallaplantproject.metrics import registry
+
+        cache.clear()
+        registry.clear()
+        self.client = Client()
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.post_000 = create_post(title='first post', content='# hello\n\nworld', author=self.author_000)
+        create_comment(self.post_000, text='*nice*', author=self.author_000)
+
+    def server_timing(self, response):
+        import re
+
+        return {
+            name: float(duration)
+            for name, duration in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])
+        }
+
+    def test_server_timing(self):
+        response = self.client.get(self.post_000.get_absolute_url())
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'markdown', 'template', 'view', 'total'})
+        self.assertGreater(timing['markdown'], 0)
+        self.assertGreater(timing['template'], 0)
+        self.assertGreaterEqual(timing['total'], timing['view'])
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_metrics_endpoint(self):
+        self.client.get(self.post_000.get_absolute_url())
+        self.client.get(self.post_000.get_absolute_url())
+        self.client.get('/blog/')
+
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('# TYPE hallaplant_request_duration_seconds histogram', text)
+        self.assertIn('hallaplant_request_duration_seconds_count{route="/blog/<int:pk>/",phase="total"} 2', text)
+        self.assertIn('hallaplant_request_duration_seconds_bucket{route="/blog/",phase="db",le="+Inf"} 1', text)
+        self.assertIn('hallaplant_request_queries_count{route="/blog/<int:pk>/"} 2', text)
+
+        # 다른 곳에서는 볼 수 없다
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1').status_code, 404)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        from hallaplantproject.metrics import registry
+
+        response = self.client.get(self.post_000.get_absolute_url())
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(registry.durations, {})
+
+
+class TestProfiling(TestCase):
+    def setUp(self):
+        self.profiling_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(PROFILING_ENABLED=True, PROFILING_ROOT=self.profiling_root)
+        self.settings_override.enable()
+        self.client = Client()
+        self.staff = User.objects.create_user(username='staff', password='nopassword', is_staff=True, is_superuser=True)
+        self.author_000 = User.objects.create_user(username='smith', password='nopassword')
+        self.post_000 = create_post(title='first post', content='# hello\n\nworld', author=self.author_000)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.profiling_root)
+
+    def test_sampler(self):
+        import threading
+        import time
+        from hallaplantproject.profiling import StackSampler
+
+        def busy_loop():
+            end = time.perf_counter() + 0.1
+            while time.perf_counter() < end:
+                sum(range(100))
+
+        sampler = StackSampler(threading.get_ident(), 0.001)
+        sampler.start()
+        busy_loop()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        self.assertIn('busy_loop (blog/tests.py:', sampler.folded())
+        self.assertIn('busy_loop', sampler.summary())
+
+    def test_staff_capture(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        out = StringIO()
+        call_command('profile_url', 'staff', self.post_000.get_absolute_url(), stdout=out)
+        url = out.getvalue().strip()
+
+        # 로그인하지 않았거나 다른 사용자면 측정하지 않는다
+        self.assertFalse(self.client.get(url).has_header('X-Profile-Id'))
+        self.client.login(username='smith', password='nopassword')
+        self.assertFalse(self.client.get(url).has_header('X-Profile-Id'))
+
+        self.client.login(username='staff', password='nopassword')
+        self.assertFalse(self.client.get(self.post_000.get_absolute_url() + '?profile=forged').has_header('X-Profile-Id'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        capture = ProfileCapture.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(capture.user, self.staff)
+        self.assertEqual(capture.status_code, 200)
+        self.assertTrue(capture.path.startswith(self.post_000.get_absolute_url()))
+        self.assertTrue(os.path.exists(os.path.join(self.profiling_root, capture.stacks.name)))
+
+        response = self.client.get('/admin/blog/profilecapture/')
+        self.assertContains(response, capture.path[:20])
+        response = self.client.get('/admin/blog/profilecapture/{}/stacks/'.format(capture.pk))
+        self.assertEqual(response.status_code, 200)
+
+        with override_settings(PROFILING_ENABLED=False):
+            self.assertFalse(self.client.get(url).has_header('X-Profile-Id'))
+
+        capture.delete()
+        self.assertEqual(os.listdir(self.profiling_root), [])
+
+
+class TestWarmUp(TestCase):
+    def test_warm_up(self):
+        from hallaplantproject import warmup
+
+        self.assertIn('blog/post_list.html', warmup.project_template_names())
+        self.assertIn('main/index.html', warmup.project_template_names())
+        self.assertNotIn('admin/base.html', warmup.project_template_names())
+        timings = warmup.warm_up()
+        self.assertEqual([name for name, _, _ in timings], [name for name, _ in warmup.STEPS])
+        # 실패한 단계가 없다
+        self.assertNotIn(None, [count for _, _, count in timings])
+
+        with override_settings(WARMUP_ON_STARTUP=False):
+            self.assertEqual(warmup.warm_up_on_startup(), [])
+
+    def test_startup_report(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .management.commands.startup_report import import_times
+
+        packages = import_times([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       100 |        100 |     markdown.util',
+            'import time:       200 |        300 |   markdown',
+            'import time:       500 |        800 | markdownx',
+            'import time:        50 |         50 | json',
+        ])
+        self.assertEqual(packages['markdownx'], [0.0008, 3])
+        self.assertEqual(packages['json'], [0.00005, 1])
+
+        out = StringIO()
+        call_command('startup_report', '--top', '5', stdout=out)
+        self.assertIn('django', out.getvalue())
+        self.assertIn('warm-up templates', out.getvalue())
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('tag/<str:slug>/', views.PostListByTag.as_view()),
     path('category/<str:slug>/', views.PostListByCategory.as_view()),
+    path('search/', views.PostSearch.as_view()),
+    path('me/', views.user_state),
     path('<int:pk>/new_comment/', views.new_comment),
     path('<int:pk>/update/', views.PostUpdate.as_view()),
     path('<int:pk>/', views.PostDetail.as_view()), # object
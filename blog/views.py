@@ -1,31 +1,87 @@
-from django.shortcuts import redirect
-from .models import Post, Category, Tag
+from django.db.models import Prefetch
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect, get_object_or_404
+from .models import Post, Category, Tag, Comment
 from .forms import CommentForm
+from .pagination import KeysetPaginationMixin, NumberedPage
+from . import related, search
+from .sidebar import get_sidebar_context
+from .pagecache import PageCacheMixin
+from .conditional import ConditionalGetMixin
+from .invalidation import POSTS, SIDEBAR, post_key, tag_key, category_key
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
 from django.views.generic import ListView, DetailView, UpdateView, CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-class PostList(ListView):
-    model = Post
+def with_card_relations(queryset):
+    # post 카드에서 쓰는 category, author, tags를 한번에 가져온다 (N+1 방지)
+    return queryset.select_related('category', 'author').prefetch_related('tags')
 
-    def get_queryset(self):
-        return Post.objects.order_by('-created')
+def for_cards(queryset):
+    # 목록에서는 excerpt만 쓰므로 본문은 가져오지 않는다
+    return with_card_relations(queryset).defer('content', 'content_html')
 
-    def get_context_data(self, *, object_list=None, **kwargs): # context에 다른 객체들을 넣어 보낼수있다
-        context = super(PostList, self).get_context_data(**kwargs)
-        # template에서 {{ category_list }} 와 {{ posts_without_category }} 사용 가능
-        context['category_list'] = Category.objects.all() # 카테고리 객체들
-        context['posts_without_category'] = Post.objects.filter(category=None).count() # 미분류 카테고리 객체의 갯수
+class SidebarMixin:
+    def get_context_data(self, **kwargs): # context에 다른 객체들을 넣어 보낼수있다
+        context = super(SidebarMixin, self).get_context_data(**kwargs)
+        # template에서 {{ category_list }} 와 {{ posts_without_category }} 사용 가능 (캐시됨)
+        context.update(get_sidebar_context())
 
         return context
 
-class PostDetail(DetailView):
+class PostSortMixin:
+    # ?sort= 로 목록 순서를 바꾼다. 댓글 순서는 Post의 comment_count, last_comment_at 컬럼과 인덱스를 쓴다 (집계 쿼리 없음)
+    sort_orderings = {
+        'recent': ('-created', '-pk'),
+        'discussed': ('-comment_count', '-pk'), # 댓글 많은 순
+        'active': ('-last_comment_at', '-pk'), # 최근 댓글 순 (댓글 있는 게시물만)
+    }
+
+    def sort_posts(self, queryset):
+        self.sort = self.request.GET.get('sort', 'recent')
+        if self.sort not in self.sort_orderings:
+            raise Http404
+        self.keyset_ordering = self.sort_orderings[self.sort]
+        if self.sort == 'active':
+            queryset = queryset.exclude(last_comment_at=None)
+        return queryset.order_by(*self.keyset_ordering)
+
+    def get_context_data(self, **kwargs):
+        context = super(PostSortMixin, self).get_context_data(**kwargs)
+        context['sort'] = self.sort
+
+        return context
+
+class PostList(ConditionalGetMixin, PageCacheMixin, SidebarMixin, PostSortMixin, KeysetPaginationMixin, ListView):
     model = Post
+    use_replica = True # 조회만 하는 view는 replica에서 읽는다 (hallaplantproject/routers.py)
+
+    def get_cache_dependencies(self):
+        return [POSTS, SIDEBAR]
+
+    def get_queryset(self):
+        return self.sort_posts(for_cards(Post.objects.all()))
+
+class PostDetail(ConditionalGetMixin, PageCacheMixin, SidebarMixin, DetailView):
+    model = Post
+    use_replica = True
+
+    def get_cache_dependencies(self):
+        return [post_key(self.kwargs['pk']), SIDEBAR]
+
+    def get_queryset(self):
+        comments = Comment.objects.select_related('author').order_by('pk')
+        return with_card_relations(Post.objects.all()).prefetch_related(
+            Prefetch('comment_set', queryset=comments),
+        )
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(PostDetail, self).get_context_data(**kwargs)
-        context['category_list'] = Category.objects.all()
-        context['posts_without_category'] = Post.objects.filter(category=None).count()
         context['comment_form'] = CommentForm()
+        # 미리 계산해 둔 목록을 읽기만 한다 (blog/related.py)
+        context['related_posts'] = related.related_posts(self.object)
 
         return context
 
@@ -49,48 +105,81 @@ class PostUpdate(UpdateView):
         'title', 'content', 'head_image', 'category', 'tags',
     ]
 
-class PostListByTag(ListView):
-    
+class PostListByTag(ConditionalGetMixin, PageCacheMixin, SidebarMixin, PostSortMixin, KeysetPaginationMixin, ListView):
+    use_replica = True
+
+    def get_cache_dependencies(self):
+        return [tag_key(self.kwargs['slug']), SIDEBAR]
+
     def get_queryset(self):
         tag_slug = self.kwargs['slug']
-        tag = Tag.objects.get(slug=tag_slug)
+        self.tag = get_object_or_404(Tag, slug=tag_slug)
 
-        return tag.post_set.order_by('-created')
+        return self.sort_posts(for_cards(self.tag.post_set.all()))
 
     def get_context_data(self, *, object_list=None, **kwargs): # context에 다른 객체들을 넣어 보낼수있다
         context = super(type(self), self).get_context_data(**kwargs)
-        # template에서 {{ category_list }} 와 {{ posts_without_category }} 사용 가능
-        context['category_list'] = Category.objects.all() # 카테고리 객체들
-        context['posts_without_category'] = Post.objects.filter(category=None).count() # 미분류 카테고리 객체의 갯수
-        tag_slug = self.kwargs['slug']
-        context['tag'] = tag = Tag.objects.get(slug=tag_slug)
+        context['tag'] = self.tag
 
         return context
 
-class PostListByCategory(ListView):
-    
+class PostListByCategory(ConditionalGetMixin, PageCacheMixin, SidebarMixin, PostSortMixin, KeysetPaginationMixin, ListView):
+    use_replica = True
+
+    def get_cache_dependencies(self):
+        return [category_key(self.kwargs['slug']), SIDEBAR]
+
     def get_queryset(self):
         slug = self.kwargs['slug']
         
         if slug == '_none':
-            category = None
+            self.category = None
         else:
-            category = Category.objects.get(slug=slug)
-        return Post.objects.filter(category=category).order_by('-created')
+            self.category = get_object_or_404(Category, slug=slug)
+        return self.sort_posts(for_cards(Post.objects.filter(category=self.category)))
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(type(self), self).get_context_data(**kwargs)
-        context['category_list'] = Category.objects.all()
-        context['posts_without_category'] = Post.objects.filter(category=None).count()
 
-        
-        slug = self.kwargs['slug']
-
-        if slug == '_none':
+        if self.category is None:
             context['category'] = '미분류'
         else:
-            category = Category.objects.get(slug=slug)
-            context['category'] = category
+            context['category'] = self.category
+
+        return context
+
+class PostSearch(SidebarMixin, ListView):
+    template_name = 'blog/post_list.html'
+    use_replica = True
+
+    def get_queryset(self):
+        self.search_query = self.request.GET.get('q', '').strip()
+        try:
+            self.page_number = int(self.request.GET.get('page', 1))
+        except ValueError:
+            raise Http404
+        if self.page_number < 1:
+            raise Http404
+
+        page_size = getattr(settings, 'BLOG_POSTS_PER_PAGE', 5)
+        post_ids = search.search_post_ids(
+            self.search_query,
+            limit=page_size + 1,
+            offset=(self.page_number - 1) * page_size,
+        )
+        self.has_next = len(post_ids) > page_size
+        post_ids = post_ids[:page_size]
+
+        # 검색 순위 순서를 유지한다
+        posts = for_cards(Post.objects.filter(pk__in=post_ids)).in_bulk()
+        return [posts[pk] for pk in post_ids if pk in posts]
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super(PostSearch, self).get_context_data(**kwargs)
+        page = NumberedPage(context['object_list'], self.request.GET, self.page_number, self.has_next)
+        context['page_obj'] = page
+        context['is_paginated'] = page.has_other_pages()
+        context['search_query'] = self.search_query
 
         return context
 
@@ -108,4 +197,15 @@ def new_comment(request, pk):
     else:
         return redirect('/blog/')
 
-
+@never_cache
+def user_state(request):
+    # 캐시되는 페이지에 넣지 않은 사용자별 정보 (blog/static/blog/assets/js/user-state.js에서 사용)
+    user = request.user
+    if not user.is_authenticated:
+        return JsonResponse({'authenticated': False, 'id': None, 'username': None, 'csrf_token': None})
+    return JsonResponse({
+        'authenticated': True,
+        'id': user.pk,
+        'username': user.get_username(),
+        'csrf_token': get_token(request),
+    })
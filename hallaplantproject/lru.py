@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    프로세스 안에서 쓰는 작은 LRU 캐시. 항목 수와 값의 전체 크기(len) 둘 다로 제한한다.
+    pickle을 거치지 않으므로 큰 bytes를 자주 꺼내 쓰는 곳(압축된 응답 등)에 쓴다.
+    """
+
+    def __init__(self, max_entries=1000, max_size=None, size=len):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @property
+    def total_size(self):
+        return self._total
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self.size(value) if self.max_size is not None else 0
+        if self.max_size is not None and size > self.max_size:
+            return # 혼자서 캐시를 다 차지하는 값은 넣지 않는다
+        with self._lock:
+            if key in self._data:
+                self._total -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._total += size
+            while len(self._data) > self.max_entries or (self.max_size is not None and self._total > self.max_size):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._total -= evicted
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._total -= self._data.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._total = 0
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,190 @@
+"""
+MEDIA_ROOT의 업로드 파일을 보낸다 (MEDIA_URL).
+
+- If-None-Match / If-Modified-Since 이면 파일을 열지 않고 304
+- MEDIA_SENDFILE이 설정되어 있으면 헤더만 만들고 전송은 앞단 웹서버에 맡긴다
+    'x-accel-redirect': nginx. MEDIA_ACCEL_REDIRECT_PREFIX 아래의 internal location으로 넘긴다
+    'x-sendfile': apache mod_xsendfile, lighttpd. 파일의 절대 경로를 넘긴다
+  range 요청도 웹서버가 처리하므로 worker는 바로 다음 요청을 받는다.
+- 아니면 FileResponse로 보낸다. gunicorn, uwsgi는 wsgi.file_wrapper로 받은 파일을 sendfile(2)로 보내므로
+  본문이 python을 거치지 않는다. Range: bytes=a-b (하나) 는 206으로 그 부분만 보낸다.
+
+내용 hash 이름(ContentAddressedStorage)의 원본 파일은 내용이 바뀌지 않으므로 1년 동안 캐시한다.
+다시 만들어질 수 있는 파일(크기별 이미지 등)은 mtime-size ETag로 매번 확인한다.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .middleware import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from .storage import is_content_addressed
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeFile:
+    """
+    파일의 start부터 length bytes만 읽히는 file 객체.
+    fileno()가 있으므로 wsgi.file_wrapper(gunicorn)는 현재 위치부터 Content-Length만큼 sendfile로 보낸다.
+    """
+
+    def __init__(self, f, start, length):
+        self.file = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(start, end) (end 포함). 형식이 다르거나 여러 구간이면 None (전체를 보냄), 만족할 수 없으면 ValueError"""
+    match = RANGE_RE.match((header or '').replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500: 마지막 500 bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def is_immutable(name):
+    # 원본 hash 이름만. 크기별 이미지(<hash>.750w.webp)는 같은 이름으로 다시 만들어질 수 있다
+    return is_content_addressed(name)
+
+
+def file_etag(name, stat):
+    if is_immutable(name):
+        # 이름에 내용 hash가 들어 있다
+        return quote_etag(os.path.basename(name))
+    # 같은 초 안에 다시 쓰여도 구분되도록 ns 단위
+    return quote_etag('{:x}-{:x}'.format(stat.st_mtime_ns, stat.st_size))
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def offload(response, name, path):
+    backend = getattr(settings, 'MEDIA_SENDFILE', None)
+    if backend == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+    elif backend == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError('unknown MEDIA_SENDFILE: {}'.format(backend))
+    return response
+
+
+def serve_media(request, path, document_root=None):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    document_root = document_root or settings.MEDIA_ROOT
+    name = path.lstrip('/')
+    try:
+        full_path = safe_join(document_root, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = file_etag(name, stat)
+    last_modified = int(stat.st_mtime)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if is_immutable(name) else REVALIDATE_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+        'X-Content-Type-Options': 'nosniff',
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        for header, value in headers.items():
+            if header not in response:
+                response[header] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    # .gz 등은 압축을 풀지 않고 그대로 받도록 (Content-Encoding을 붙이지 않음)
+    content_type = 'application/octet-stream' if encoding or not content_type else content_type
+
+    if getattr(settings, 'MEDIA_SENDFILE', None):
+        response = HttpResponse(content_type=content_type)
+        for header, value in headers.items():
+            response[header] = value
+        return offload(response, name, full_path)
+
+    size = stat.st_size
+    byte_range = None
+    if request.META.get('HTTP_RANGE') and if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    f = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(f, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+        response['Content-Length'] = str(end - start + 1)
+    response.block_size = BLOCK_SIZE
+    if response.has_header('Content-Disposition'):
+        del response['Content-Disposition']
+    for header, value in headers.items():
+        response[header] = value
+    return response
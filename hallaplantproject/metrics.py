@@ -0,0 +1,210 @@
+"""
+요청별 성능 측정 (MetricsMiddleware).
+
+표본으로 뽑힌 요청(METRICS_SAMPLE_RATE)마다 SQL 수와 시간, markdown 렌더링, template 렌더링, view, 전체 시간을 재서
+Server-Timing 헤더로 보내고 url pattern별 histogram에 더한다. histogram은 /metrics/ 에서 prometheus text 형식으로 볼 수 있다.
+집계는 프로세스마다 따로이므로 prometheus에서 worker들을 합쳐서 본다.
+"""
+import contextvars
+import functools
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+# 측정하는 구간 (Server-Timing 이름). markdown은 template 안에서 불리므로 template 시간에도 들어있다
+PHASES = ('db', 'markdown', 'template', 'view', 'total')
+DESCRIPTIONS = {
+    'db': 'SQL',
+    'markdown': 'Markdown',
+    'template': 'Template',
+    'view': 'View',
+    'total': 'Total',
+}
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# 지금 측정 중인 요청. 표본이 아니면 None이라 timed()는 바로 원래 함수를 부른다
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.durations[phase] += seconds
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.durations['db'] += time.perf_counter() - started
+
+    def server_timing(self):
+        entries = []
+        for phase in PHASES:
+            description = DESCRIPTIONS[phase]
+            if phase == 'db':
+                description = '{} queries'.format(self.queries)
+            entries.append('{};dur={:.2f};desc="{}"'.format(phase, self.durations[phase] * 1000, description))
+        return ', '.join(entries)
+
+
+def timed(phase):
+    """측정 중인 요청이면 함수 실행 시간을 phase에 더한다"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = current.get()
+            if metrics is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.add(phase, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """url pattern별 histogram"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.durations = {} # (route, phase) -> Histogram
+        self.queries = {} # route -> Histogram
+
+    def observe(self, route, metrics):
+        with self.lock:
+            for phase in PHASES:
+                key = (route, phase)
+                if key not in self.durations:
+                    self.durations[key] = Histogram(DURATION_BUCKETS)
+                self.durations[key].observe(metrics.durations[phase])
+            if route not in self.queries:
+                self.queries[route] = Histogram(QUERY_BUCKETS)
+            self.queries[route].observe(metrics.queries)
+
+    def render(self):
+        lines = [
+            '# HELP hallaplant_request_duration_seconds Time spent per request phase (sampled requests).',
+            '# TYPE hallaplant_request_duration_seconds histogram',
+        ]
+        with self.lock:
+            for (route, phase), histogram in sorted(self.durations.items()):
+                lines.extend(render_histogram(
+                    'hallaplant_request_duration_seconds', histogram, route=route, phase=phase,
+                ))
+            lines.append('# HELP hallaplant_request_queries SQL queries per request (sampled requests).')
+            lines.append('# TYPE hallaplant_request_queries histogram')
+            for route, histogram in sorted(self.queries.items()):
+                lines.extend(render_histogram('hallaplant_request_queries', histogram, route=route))
+        return '\n'.join(lines) + '\n'
+
+
+def label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_histogram(name, histogram, **labels):
+    base = ','.join('{}="{}"'.format(key, label_value(value)) for key, value in labels.items())
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, base, bound, count))
+    lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, base, histogram.total))
+    lines.append('{}_sum{{{}}} {}'.format(name, base, round(histogram.sum, 6)))
+    lines.append('{}_count{{{}}} {}'.format(name, base, histogram.total))
+    return lines
+
+
+registry = Registry()
+
+
+def sample_rate():
+    return getattr(settings, 'METRICS_SAMPLE_RATE', 0.0)
+
+
+class MetricsMiddleware:
+    """
+    MIDDLEWARE 앞쪽에 둔다 (total에 안쪽 middleware, 응답 압축까지 들어가도록).
+    표본이 아닌 요청은 random() 한번만 하고 그대로 넘긴다.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        request._metrics = metrics
+        token = current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+
+        now = time.perf_counter()
+        view_started = getattr(request, '_metrics_view_started', None)
+        if view_started is not None:
+            metrics.add('view', getattr(request, '_metrics_view_finished', now) - view_started)
+        metrics.add('total', now - started)
+
+        if getattr(settings, 'METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing()
+        match = getattr(request, 'resolver_match', None)
+        registry.observe('/' + match.route if match is not None else '(unmatched)', metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_metrics'):
+            request._metrics_view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, '_metrics', None)
+        if metrics is None:
+            return response
+        # view는 template을 고른 데까지, 그 뒤 render()는 template 시간
+        started = request._metrics_view_finished = time.perf_counter()
+        response.add_post_render_callback(lambda r: metrics.add('template', time.perf_counter() - started))
+        return response
+
+
+def metrics_view(request):
+    # prometheus가 같은 서버(또는 METRICS_ALLOWED_IPS)에서만 가져간다
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1',)):
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
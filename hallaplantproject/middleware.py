@@ -0,0 +1,216 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from .lru import LRUCache
+from .routers import choose_replica, read_alias, replicas, sticky_cookie_name
+from .storage import ENCODINGS, brotli, compress_brotli, compress_gzip
+
+# 파일 이름에 hash가 붙은 정적 파일은 내용이 바뀌면 이름도 바뀌므로 1년 동안 다시 묻지 않는다
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# 원래 이름 그대로 요청한 파일은 짧게 캐시하고 Last-Modified로 재검증
+REVALIDATE_CACHE_CONTROL = 'public, max-age=60'
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+
+
+def accepted_encodings(header):
+    """Accept-Encoding에서 q=0이 아닌 encoding 목록"""
+    accepted = set()
+    for token in (header or '').split(','):
+        parts = [part.strip() for part in token.split(';')]
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if parts[0] and quality > 0:
+            accepted.add(parts[0].lower())
+    return accepted
+
+
+def compressed_variant(path, accept_encoding):
+    """브라우저가 받을 수 있는 미리 압축된 파일 (경로, encoding). 없으면 (path, None)"""
+    accepted = accepted_encodings(accept_encoding)
+    for suffix, encoding in ENCODINGS:
+        if (encoding in accepted or '*' in accepted) and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+class StaticFilesMiddleware:
+    """
+    collectstatic으로 STATIC_ROOT에 모은 파일을 보낸다.
+    미리 만들어 둔 .br/.gz 중 브라우저가 받을 수 있는 것을 고르고, hash가 붙은 파일에는 immutable 헤더를 붙인다.
+    STATIC_ROOT에 없는 파일은 그대로 다음 단계로 넘긴다 (DEBUG 개발 서버는 앱의 static 폴더에서 찾음).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and settings.STATIC_ROOT and request.path.startswith(settings.STATIC_URL):
+            response = self.serve(request, request.path[len(settings.STATIC_URL):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def is_immutable(self, name):
+        if not HASHED_NAME_RE.search(name):
+            return False
+        hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+        return hashed_files is None or name in hashed_files.values()
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except ValueError:
+            return None
+        if not name or name.endswith(tuple(suffix for suffix, _ in ENCODINGS)) or not os.path.isfile(path):
+            return None
+
+        immutable = self.is_immutable(name)
+        stat = os.stat(path)
+        if not immutable:
+            modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+            if modified_since is not None and int(stat.st_mtime) <= modified_since:
+                response = HttpResponseNotModified()
+                response['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+                return response
+
+        content_type, _ = mimetypes.guess_type(path)
+        send_path, encoding = compressed_variant(path, request.META.get('HTTP_ACCEPT_ENCODING'))
+        response = FileResponse(open(send_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        if response.has_header('Content-Disposition'):
+            del response['Content-Disposition'] # FileResponse가 .gz 파일 이름을 넣으므로
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if any(os.path.isfile(path + suffix) for suffix, _ in ENCODINGS):
+            response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        return response
+
+
+# 이미 압축된 형식(이미지, zip 등)은 다시 압축해도 줄지 않는다
+COMPRESSIBLE_CONTENT_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/rss+xml',
+    'image/svg+xml',
+)
+
+# 같은 내용의 응답을 다시 압축하지 않도록 (encoding, 본문 md5) -> 압축된 bytes를 보관한다.
+# 페이지 캐시에서 꺼낸 응답은 본문이 같으므로 여기서 바로 찾는다
+compressed_responses = LRUCache(max_entries=2000, max_size=getattr(settings, 'COMPRESSION_CACHE_SIZE', 16 * 1024 * 1024))
+
+
+def dynamic_compressors():
+    # 요청마다 압축할 수도 있으므로 collectstatic보다 낮은 단계로
+    compressors = []
+    if brotli is not None:
+        compressors.append(('br', lambda data: compress_brotli(data, 5)))
+    compressors.append(('gzip', lambda data: compress_gzip(data, 6)))
+    return compressors
+
+
+class CompressionMiddleware:
+    """
+    Accept-Encoding에 따라 응답을 br/gzip으로 압축한다.
+    작은 응답, 이미 압축된 형식, streaming 응답은 그대로 보내고
+    CSRF 토큰이 들어간 응답은 BREACH 공격을 피하기 위해 압축하지 않는다.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def is_compressible(self, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding') or not self.is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+        if request.META.get('CSRF_COOKIE_USED'):
+            return response
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING'))
+        for encoding, compress in dynamic_compressors():
+            if encoding in accepted:
+                break
+        else:
+            return response
+
+        key = (encoding, hashlib.md5(response.content).hexdigest())
+        compressed = compressed_responses.get(key)
+        if compressed is None:
+            compressed = compress(response.content)
+            compressed_responses.set(key, compressed)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # 압축된 본문은 바이트가 다르므로 ETag를 약한 ETag로 바꾼다 (django GZipMiddleware와 같은 방식)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    view에 use_replica = True가 있으면 이 요청의 조회를 replica로 보낸다 (hallaplantproject/routers.py).
+    쓰기 요청 뒤에는 cookie를 남겨 DATABASE_STICKY_SECONDS 동안 primary에서 읽게 한다.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+
+        if request.method not in self.safe_methods and replicas():
+            response.set_cookie(
+                sticky_cookie_name(), '1',
+                max_age=getattr(settings, 'DATABASE_STICKY_SECONDS', 15),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', view_func)
+        if not getattr(view_class, 'use_replica', False) or request.method not in ('GET', 'HEAD'):
+            return None
+        if request.COOKIES.get(sticky_cookie_name()):
+            return None
+        alias = choose_replica()
+        if alias:
+            read_alias.set(alias)
+        return None
@@ -0,0 +1,170 @@
+"""
+staff가 요청 하나를 골라 sampling profiler로 잴 수 있게 한다 (ProfilingMiddleware).
+
+    manage.py profile_url <username> /blog/123/   ->  /blog/123/?profile=<서명된 token>
+
+token은 그 staff 사용자에게만 유효하고 PROFILING_TOKEN_MAX_AGE 뒤에 만료된다.
+측정하는 동안에만 별도 thread가 요청 thread의 call stack을 PROFILING_INTERVAL마다 읽으므로
+그 외의 요청에는 비용이 없다. 결과는 flame graph용 folded stack 파일(PROFILING_ROOT)과
+blog.ProfileCapture(admin)에 남는다.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+
+TOKEN_SALT = 'hallaplantproject.profiling'
+QUERY_PARAM = 'profile'
+HEADER = 'HTTP_X_PROFILE'
+
+# 한 프로세스에서 동시에 하나만 잰다
+profile_lock = threading.Lock()
+
+
+def make_token(user):
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def token_user_id(token):
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 60 * 60))
+    except signing.BadSignature:
+        return None
+    return data.get('user')
+
+
+class ProfileStorage(FileSystemStorage):
+    """PROFILING_ROOT에 저장한다. MEDIA_ROOT와 달리 웹으로 공개되지 않는다 (admin에서만 받을 수 있음)"""
+
+    @property
+    def base_location(self):
+        return self._value_or_setting(self._location, getattr(settings, 'PROFILING_ROOT', None))
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def frame_label(code):
+    filename = code.co_filename
+    for root in [settings.BASE_DIR] + [path for path in sys.path if path.endswith('-packages')]:
+        if filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    # folded 형식에서 ';'는 구분자
+    return '{} ({}:{})'.format(code.co_name, filename, code.co_firstlineno).replace(';', ':')
+
+
+class StackSampler:
+    """thread_id의 call stack을 interval마다 읽어 stack별 횟수를 센다"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self):
+        """flamegraph.pl, speedscope에서 읽을 수 있는 folded stack"""
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in self.stacks.most_common())
+
+    def summary(self, limit=25):
+        """함수별 self/total sample 수 상위 목록"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        lines = ['{:>6} {:>6}  {}'.format('self', 'total', 'function')]
+        for frame, count in own.most_common(limit):
+            lines.append('{:>6} {:>6}  {}'.format(count, total[frame], frame))
+        lines.append('')
+        lines.append('{:>6} {:>6}  {}'.format('', 'total', 'cumulative'))
+        for frame, count in total.most_common(limit):
+            lines.append('{:>6} {:>6}  {}'.format('', count, frame))
+        return '\n'.join(lines)
+
+
+class ProfilingMiddleware:
+    """AuthenticationMiddleware 뒤에 둔다. 유효한 token을 가진 staff 요청만 잰다"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def requested_token(self, request):
+        return request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+
+    def should_profile(self, request):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            return False
+        token = self.requested_token(request)
+        if not token:
+            return False
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated or not user.is_staff:
+            return False
+        return token_user_id(token) == user.pk
+
+    def __call__(self, request):
+        if not self.should_profile(request) or not profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_INTERVAL', 0.002))
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+            capture = save_capture(request, response, sampler)
+            response['X-Profile-Id'] = str(capture.pk)
+            return response
+        finally:
+            profile_lock.release()
+
+
+def save_capture(request, response, sampler):
+    from django.core.files.base import ContentFile
+    from blog.models import ProfileCapture
+
+    capture = ProfileCapture(
+        path=request.get_full_path()[:500],
+        method=request.method,
+        user=request.user,
+        status_code=response.status_code,
+        duration_ms=int(sampler.duration * 1000),
+        samples=sampler.samples,
+        interval_ms=sampler.interval * 1000,
+        summary=sampler.summary(),
+    )
+    name = '{}-{}.folded'.format(time.strftime('%Y%m%d-%H%M%S'), threading.get_ident())
+    capture.stacks.save(name, ContentFile(sampler.folded().encode('utf-8')), save=False)
+    capture.save()
+    return capture
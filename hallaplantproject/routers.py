@@ -0,0 +1,48 @@
+"""
+읽기 전용 view(use_replica = True)의 조회는 replica로, 나머지는 모두 primary(default)로 보낸다.
+
+어느 DB에서 읽을지는 요청마다 ReplicaMiddleware가 정한다.
+글을 쓴(POST 등) 브라우저에는 잠깐 동안 cookie를 남겨 그동안은 primary에서 읽게 한다 (replica 지연 때문에
+방금 쓴 댓글이 안 보이는 일이 없도록).
+"""
+import contextvars
+import random
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# 이 요청에서 조회에 쓸 DB alias. None이면 primary
+read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def sticky_cookie_name():
+    return getattr(settings, 'DATABASE_STICKY_COOKIE', 'use_primary')
+
+
+def reading_from_replica():
+    return read_alias.get() not in (None, PRIMARY)
+
+
+def choose_replica():
+    aliases = replicas()
+    return random.choice(aliases) if aliases else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replica는 primary의 복사본이므로 어느 쪽에서 읽은 객체든 서로 연결할 수 있다
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replica의 schema는 primary에서 복제된다
+        return db not in replicas()
@@ -31,7 +31,7 @@ ALLOWED_HOSTS = ['ec2-52-78-172-108.ap-northeast-2.compute.amazonaws.com', '127.
 # Application definition
 
 INSTALLED_APPS = [
-    'blog',
+    'blog.apps.BlogConfig',
     'main',
 
     'django.contrib.admin',
@@ -47,10 +47,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'hallaplantproject.middleware.StaticFilesMiddleware',
+    'hallaplantproject.metrics.MetricsMiddleware',
+    'hallaplantproject.middleware.CompressionMiddleware',
+    'hallaplantproject.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'hallaplantproject.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,8 +66,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # compile한 template을 프로세스에 보관한다. 개발 서버는 template이 바뀌면 비운다
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -74,15 +85,53 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hallaplantproject.wsgi.application'
+# wsgi.py/asgi.py에서 worker가 요청을 받기 전에 미리 준비한다 (hallaplantproject/warmup.py)
+WARMUP_ON_STARTUP = True
 
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# hallaplantproject.sqlite3: django sqlite3 backend + WAL, busy_timeout (hallaplantproject/sqlite3/base.py)
+# CONN_MAX_AGE: 요청마다 새로 연결하지 않고 60초 동안 다시 쓴다
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'hallaplantproject.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+    }
+}
+
+# 읽기 전용 replica. use_replica = True인 view의 조회만 replica로 간다 (hallaplantproject/routers.py)
+# 로컬에서는 db.sqlite3를 복사한 파일로 시험할 수 있다
+#   sqlite3 db.sqlite3 ".backup replica.sqlite3"
+#   HALLAPLANT_REPLICA_DB=replica.sqlite3 python manage.py runserver
+# postgres primary/replica라면 'replica' alias에 replica 서버를 적으면 된다
+if os.environ.get('HALLAPLANT_REPLICA_DB'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ['HALLAPLANT_REPLICA_DB'],
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['hallaplantproject.routers.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# 글을 쓴 뒤 이 시간(초) 동안은 replica 대신 primary에서 읽는다 (방금 쓴 글이 바로 보이도록)
+DATABASE_STICKY_SECONDS = 15
+# replica에서 읽어 만든 페이지는 replica 지연 때문에 예전 내용일 수 있으므로 페이지 캐시에 짧게만 둔다
+DATABASE_REPLICA_PAGE_CACHE_TIMEOUT = 30
+
+
+# Cache
+# sidebar, 페이지 캐시에 사용. LocMemCache는 프로세스마다 따로 있으므로
+# worker를 여러개 띄울 때는 memcached/redis 같은 공유 캐시로 바꿔야 무효화가 모든 worker에 전달된다
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
     }
 }
 
@@ -124,10 +173,82 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+# manage.py collectstatic: 파일 이름에 내용 hash를 붙이고, 앱 사이의 중복 파일을 합치고, .gz/.br을 미리 만든다
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'hallaplantproject.storage.HashedStaticFilesStorage'
+
+# 요청별 성능 측정 (hallaplantproject/metrics.py). 이 비율의 요청만 측정한다 (0이면 끔)
+# 측정한 요청에는 Server-Timing 헤더가 붙고, url pattern별 histogram은 /metrics/ 에서 볼 수 있다
+METRICS_SAMPLE_RATE = 0.1
+METRICS_SERVER_TIMING = True
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# staff 요청 하나를 sampling profiler로 잰다 (hallaplantproject/profiling.py)
+# manage.py profile_url <username> <path> 로 만든 주소(?profile=<token>)로 요청하면 결과가 admin의 Profile captures에 남는다
+PROFILING_ENABLED = True
+PROFILING_ROOT = os.path.join(BASE_DIR, 'profiles') # 웹으로 공개하지 않는 곳
+PROFILING_INTERVAL = 0.002 # 초
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# 응답 압축 (hallaplantproject.middleware.CompressionMiddleware). 이보다 작은 응답은 압축하지 않는다
+COMPRESSION_MIN_SIZE = 1024
+# 압축된 본문을 프로세스 메모리에 보관하는 최대 크기(bytes)
+COMPRESSION_CACHE_SIZE = 16 * 1024 * 1024
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# 업로드는 내용 hash 이름으로 저장하고 같은 내용은 한번만 저장한다. 기존 파일은 manage.py hash_media
+DEFAULT_FILE_STORAGE = 'hallaplantproject.storage.ContentAddressedStorage'
+# MEDIA_URL을 django가 받는다 (hallaplantproject/media.py). 웹서버가 직접 보내면 False
+MEDIA_SERVE = True
+# None이면 django가 보내고(wsgi.file_wrapper), 'x-accel-redirect'(nginx), 'x-sendfile'(apache, lighttpd)이면 웹서버가 보낸다
+MEDIA_SENDFILE = os.environ.get('HALLAPLANT_MEDIA_SENDFILE') or None
+# nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# 날짜는 업로드할 때마다 storage에서 채운다
+MARKDOWNX_MEDIA_PATH = 'markdownx/%Y/%m/%d'
+# markdownx 편집기 미리보기 (blog/preview.py)
+BLOG_PREVIEW_CACHE_ENTRIES = 1000
+BLOG_PREVIEW_CACHE_SIZE = 8 * 1024 * 1024 # 프로세스당 렌더링 결과 캐시 크기 (문자 수)
+BLOG_PREVIEW_RATE = (20, 10) # 사용자별로 10초에 20번까지 렌더링
+BLOG_PREVIEW_WAIT = 5 # 같은 사용자의 앞선 렌더링을 기다리는 최대 시간(초)
 
-from datetime import datetime
-MARKDOWNX_MEDIA_PATH = datetime.now().strftime('markdownx/%Y/%m/%d')
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# Post/Comment의 markdown 렌더링 결과는 DB에 저장된다. 렌더러를 바꾸면 이 값을 올릴 것
+BLOG_MARKDOWN_RENDER_VERSION = 1
+# 블로그 목록 한 페이지에 보여줄 게시물 수 (keyset pagination)
+BLOG_POSTS_PER_PAGE = 5
+# sidebar 카테고리 목록 캐시 시간(초). 변경 시 바로 지워지므로 길게 둬도 된다
+BLOG_SIDEBAR_CACHE_TIMEOUT = 60 * 10
+# 검색 색인에 댓글 내용도 포함할지 여부 (바꾼 뒤에는 manage.py rebuild_search_index)
+BLOG_SEARCH_INCLUDE_COMMENTS = False
+# 상세 페이지의 관련 게시물 (blog/related.py). 바꾸면 manage.py rebuild_related_posts
+BLOG_RELATED_POSTS = 5
+BLOG_RELATED_TITLE_WEIGHT = 0.5 # 태그 대비 제목 단어의 가중치 (0이면 태그만)
+BLOG_RELATED_MAX_POSTINGS = 1000 # 이보다 많은 게시물에 있는 태그는 쓰지 않는다
+BLOG_RELATED_REBUILD_DELAY = 60 * 10 # 게시물이 생기거나 지워진 뒤 전체를 다시 계산하기까지의 시간(초)
+# 목록 카드에 보여줄 excerpt 단어 수 (바꾸면 BLOG_MARKDOWN_RENDER_VERSION도 올릴 것)
+BLOG_EXCERPT_WORDS = 50
+# 페이지 캐시 유지 시간(초). 내용이 바뀌면 signals에서 바로 무효화된다
+BLOG_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# 게시물 페이지의 Cache-Control (브라우저는 매번 ETag로 확인, CDN/proxy는 s-maxage 동안 그대로 사용)
+BLOG_HTTP_MAX_AGE = 0
+BLOG_HTTP_SHARED_MAX_AGE = 60 # BLOG_PURGE_URL을 설정했으면 하루 정도로 늘려도 된다
+# 앞단 HTTP 캐시 purge (blog/purge.py). 응답의 BLOG_SURROGATE_KEY_HEADER에 들어있는 key로 지운다
+BLOG_SURROGATE_KEY_HEADER = 'Surrogate-Key'
+BLOG_PURGE_URL = os.environ.get('HALLAPLANT_PURGE_URL', '')
+BLOG_PURGE_HEADERS = {} # 예: {'Fastly-Key': '...'}
+BLOG_PURGE_DELAY = 1 # 이 시간(초) 동안의 변경을 모아 한번에 보낸다
+BLOG_PURGE_BATCH_SIZE = 256
+BLOG_PURGE_TIMEOUT = 5
+# head_image 업로드 시 만드는 이미지 너비(px)와 품질. 바꾼 뒤에는 manage.py generate_image_derivatives --force
+BLOG_IMAGE_WIDTHS = (400, 750, 1200)
+BLOG_IMAGE_QUALITY = 80
+
+# 작업 큐 (blog/jobs.py). 검색 색인, 이미지 처리는 manage.py run_jobs worker가 처리한다
+# True로 두면 worker 없이 요청 안에서 바로 실행
+BLOG_JOBS_EAGER = False
+BLOG_JOBS_MAX_ATTEMPTS = 5
+BLOG_JOBS_RETRY_DELAY = 10 # 첫 재시도까지의 시간(초), 실패할 때마다 두배
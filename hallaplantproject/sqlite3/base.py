@@ -0,0 +1,28 @@
+from django.db.backends.sqlite3 import base
+
+# 연결마다 적용하는 PRAGMA. DATABASES의 OPTIONS['pragmas']로 바꿀 수 있다
+#   journal_mode=WAL: 쓰는 동안에도 다른 연결이 읽을 수 있다 (댓글 저장이 목록 조회를 막지 않음)
+#   busy_timeout: 다른 연결이 쓰고 있으면 "database is locked" 대신 이 시간(ms)까지 기다린다
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """django sqlite3 backend + 연결할 때 PRAGMA 설정"""
+
+    def get_connection_params(self):
+        params = super(DatabaseWrapper, self).get_connection_params()
+        params.pop('pragmas', None) # sqlite3.connect()가 모르는 옵션
+        return params
+
+    def get_pragmas(self):
+        return dict(DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {}))
+
+    def get_new_connection(self, conn_params):
+        conn = super(DatabaseWrapper, self).get_new_connection(conn_params)
+        for name, value in self.get_pragmas().items():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+        return conn
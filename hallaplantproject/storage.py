@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import os
+import re
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+
+try:
+    import brotli
+except ImportError: # brotli가 없으면 gzip만 만든다
+    brotli = None
+
+# 미리 압축해 둘 파일 (이미지, 폰트는 이미 압축되어 있음)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.xml')
+# (확장자, Content-Encoding)
+ENCODINGS = [('.br', 'br'), ('.gz', 'gzip')]
+
+
+def compress_gzip(data, level=9):
+    # mtime=0: 같은 파일은 항상 같은 .gz가 나오도록
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_brotli(data, level=11):
+    return brotli.compress(data, quality=level)
+
+
+class HashedStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic 때 파일 이름에 내용 hash를 붙이고 (ManifestStaticFilesStorage),
+
+    - 앱마다 들어있는 같은 내용의 파일(jquery, bootstrap)은 하나만 남겨 manifest에서 같은 이름을 가리키게 하고
+    - css/js 등은 .gz(, .br)를 미리 만들어 둔다. 전송은 hallaplantproject.middleware.StaticFilesMiddleware
+    """
+    # collectstatic 전(개발 서버, 테스트)에는 manifest가 없으므로 원래 이름을 그대로 쓴다
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super(HashedStaticFilesStorage, self).stored_name(name)
+        except ValueError:
+            if self.manifest_strict:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = list(super(HashedStaticFilesStorage, self).post_process(paths, dry_run, **options))
+        for item in processed:
+            yield item
+        if dry_run:
+            return
+
+        self.deduplicate()
+        self.save_manifest()
+        for name in sorted(set(self.hashed_files.values())):
+            self.precompress(name)
+
+    def file_digest(self, name):
+        digest = hashlib.md5()
+        with self.open(name) as f:
+            for chunk in f.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def deduplicate(self):
+        """
+        내용이 같은 hash 파일은 이름이 가장 앞서는 것 하나로 모은다.
+        css 안의 상대 경로도 처리된 결과가 완전히 같을 때만 합치므로 참조가 깨지지 않는다.
+        """
+        groups = defaultdict(set)
+        for hashed_name in set(self.hashed_files.values()):
+            if self.exists(hashed_name):
+                groups[self.file_digest(hashed_name)].add(hashed_name)
+
+        removed = 0
+        for names in groups.values():
+            if len(names) < 2:
+                continue
+            canonical = min(names)
+            duplicates = names - {canonical}
+            for key, hashed_name in self.hashed_files.items():
+                if hashed_name in duplicates:
+                    self.hashed_files[key] = canonical
+            for hashed_name in duplicates:
+                self.delete(hashed_name)
+                removed += 1
+        return removed
+
+    def precompress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+            return []
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < getattr(settings, 'STATIC_COMPRESS_MIN_SIZE', 256):
+            return []
+
+        compressors = [('.gz', compress_gzip)]
+        if brotli is not None:
+            compressors.append(('.br', compress_brotli))
+
+        written = []
+        for suffix, compress in compressors:
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+            written.append(name + suffix)
+        return written
+
+
+# 업로드 파일 이름 (sha256 앞 32자리). 이 이름으로 시작하는 파일은 내용이 바뀌지 않는다
+CONTENT_HASH_LENGTH = 32
+# 확장자 하나만 (크기별 이미지 <hash>.750w.webp는 원본의 hash를 쓰고 같은 이름으로 다시 만들어지므로 제외)
+CONTENT_ADDRESSED_RE = re.compile(r'(^|/)[0-9a-f]{%d}\.[^./]+$' % CONTENT_HASH_LENGTH)
+# 원본 이름에서 파생된 크기별 이미지 이름 (blog/images.py derivative_name). 원본이 예전 이름이어도 같다
+DERIVATIVE_RE = re.compile(r'\.\d+w\.[^./]+$')
+
+
+def is_content_addressed(name):
+    """blog/2026/10/18/<hash>.jpg. 내용이 바뀌지 않는 이름이다"""
+    return bool(CONTENT_ADDRESSED_RE.search(name))
+
+
+def is_derivative(name):
+    """<hash>.750w.webp, photo.750w.webp. 이름은 원본에서 정해지지만 내용은 다시 만들어질 수 있다"""
+    return bool(DERIVATIVE_RE.search(name))
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()[:CONTENT_HASH_LENGTH]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    업로드(head_image, markdownx 이미지)를 내용 hash 이름으로 저장한다 (DEFAULT_FILE_STORAGE).
+
+    - 폴더의 %Y/%m/%d 는 업로드할 때마다 그 날짜로 바꾼다 (MARKDOWNX_MEDIA_PATH)
+    - 같은 내용은 이미 저장된 파일 이름을 돌려주고 다시 쓰지 않는다 (blog.MediaBlob에 hash -> 이름 기록)
+    - 이름이 내용으로 정해지므로 URL이 가리키는 내용은 바뀌지 않는다 -> 1년 캐시 (immutable)
+
+    이미 hash 이름인 파일과 크기별 이미지(<원본 이름>.750w.webp)는 주어진 이름 그대로 저장한다.
+    srcset이 원본 이름에서 크기별 이미지 이름을 만들기 때문이다 (blog/images.py derivative_name).
+    크기별 이미지는 BLOG_IMAGE_QUALITY 등을 바꾸면 같은 이름으로 다시 만들어지므로 immutable이 아니다.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = ContentFile(content, name)
+        if is_content_addressed(name) or is_derivative(name):
+            return super(ContentAddressedStorage, self).save(name, content, max_length)
+
+        digest = content_hash(content)
+        existing = self.existing_name(digest)
+        if existing is not None:
+            return existing
+
+        # FileField upload_to와 같은 방식 (TIME_ZONE 기준 현재 날짜)
+        directory = datetime.now().strftime(os.path.dirname(name))
+        ext = os.path.splitext(name)[1].lower()
+        hashed_name = '/'.join(part for part in (directory, digest + ext) if part)
+        if not self.exists(hashed_name):
+            hashed_name = super(ContentAddressedStorage, self).save(hashed_name, content, max_length)
+        self.remember(digest, hashed_name, content.size)
+        return hashed_name
+
+    def existing_name(self, digest):
+        from blog.models import MediaBlob
+
+        name = MediaBlob.objects.filter(digest=digest).values_list('name', flat=True).first()
+        if name is not None and self.exists(name):
+            return name
+        return None
+
+    def remember(self, digest, name, size):
+        from blog.models import MediaBlob
+
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.update_or_create(digest=digest, defaults={'name': name, 'size': size})
+        except IntegrityError:
+            pass # 같은 파일을 동시에 올린 다른 요청이 먼저 기록함
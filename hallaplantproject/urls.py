@@ -1,14 +1,27 @@
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+import re
+
+from django.urls import path, re_path, include
 from django.conf import settings
 
+from blog.preview import MarkdownPreview
+
+from .media import serve_media
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view),
+    # 미리보기는 캐시/coalescing/rate limit이 있는 view로 바꾼다 (blog/preview.py). upload는 markdownx 그대로
+    path('markdownx/markdownify/', MarkdownPreview.as_view(), name='markdownx_markdownify'),
     path('markdownx/', include('markdownx.urls')),
     path('blog/', include('blog.urls')),
     path('main/', include('main.urls')),
     path('', include('main.urls')),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# 업로드 파일. 운영에서도 django가 받아 권한/캐시 헤더를 정하고, MEDIA_SENDFILE이면 전송은 웹서버가 한다
+if settings.MEDIA_SERVE:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+    ]
@@ -0,0 +1,150 @@
+"""
+worker가 요청을 받기 전에 첫 요청이 하던 일을 미리 해 둔다 (wsgi.py, asgi.py에서 부른다).
+
+- url resolver를 만든다 (view 모듈들을 import하고 reverse 표를 채움)
+- blog, main template을 모두 compile해서 cached loader에 넣는다 (template tag 라이브러리, crispy_forms도 import됨)
+- 댓글 form을 crispy로 한번 그린다 (bootstrap4 template들)
+- markdownx의 markdown 함수로 짧은 글을 한번 렌더링한다 (markdown 확장 import)
+- 번역 catalog, static manifest를 읽는다
+
+DB에는 접속하지 않는다. gunicorn --preload이면 master에서 한번만 하고 worker들이 fork로 나눠 쓴다.
+각 단계는 (이름, 초, 처리한 개수)로 기록한다. manage.py startup_report 가 import 시간과 함께 보여준다.
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_MARKDOWN = '# warm up\n\n*hallaplant* `code` [link](/blog/)\n\n- a\n- b\n'
+
+
+def warm_urls():
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict # 모든 urlconf를 import하고 reverse 표를 만든다
+    return len(resolver.url_patterns)
+
+
+def project_template_names():
+    """BASE_DIR 아래 template 디렉터리에 있는 template 이름들 (설치된 패키지의 template은 제외)"""
+    from django.template import engines
+
+    names = set()
+    for engine in engines.all():
+        for loader in engine.engine.template_loaders:
+            for template_dir in getattr(loader, 'get_dirs', lambda: [])():
+                template_dir = str(template_dir)
+                if not template_dir.startswith(settings.BASE_DIR):
+                    continue
+                for root, _, files in os.walk(template_dir):
+                    for filename in files:
+                        if filename.endswith('.html'):
+                            names.add(os.path.relpath(os.path.join(root, filename), template_dir).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    from django.template.loader import get_template
+
+    names = project_template_names()
+    for name in names:
+        get_template(name)
+    return len(names)
+
+
+def warm_forms():
+    from django.template import Template, Context
+
+    from blog.forms import CommentForm
+
+    Template('{% load crispy_forms_tags %}{{ form|crispy }}').render(Context({'form': CommentForm()}))
+    return 1
+
+
+def warm_markdown():
+    from django.utils.module_loading import import_string
+    from markdownx.settings import MARKDOWNX_MARKDOWNIFY_FUNCTION
+
+    import_string(MARKDOWNX_MARKDOWNIFY_FUNCTION)(SAMPLE_MARKDOWN)
+    return 1
+
+
+def warm_translations():
+    from django.utils import translation
+
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.gettext('Home')
+    translation.deactivate()
+    return 1
+
+
+def warm_static():
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    staticfiles_storage.base_location # manifest를 읽는다
+    return len(getattr(staticfiles_storage, 'hashed_files', {}))
+
+
+STEPS = (
+    ('urls', warm_urls),
+    ('templates', warm_templates),
+    ('forms', warm_forms),
+    ('markdown', warm_markdown),
+    ('translations', warm_translations),
+    ('static', warm_static),
+)
+
+
+def warm_up():
+    """[(단계, 초, 개수)]. 실패한 단계는 기록만 하고 넘어간다 (첫 요청이 대신 하게 됨)"""
+    timings = []
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            count = step()
+        except Exception:
+            logger.exception('warm-up step %s failed', name)
+            count = None
+        timings.append((name, time.perf_counter() - started, count))
+    logger.info('warm-up: %s', ', '.join('{} {:.1f}ms'.format(name, seconds * 1000) for name, seconds, _ in timings))
+    return timings
+
+
+def warm_up_on_startup():
+    if getattr(settings, 'WARMUP_ON_STARTUP', True):
+        return warm_up()
+    return []
+
+
+def measure_startup():
+    """
+    새 프로세스에서 시작 단계별 시간을 잰다. startup_report가 python -X importtime 으로 이 모듈을 실행한다.
+    단계: django.setup(), WSGI handler(middleware 생성), warm_up()의 각 단계
+    """
+    import django
+
+    phases = []
+    started = time.perf_counter()
+    django.setup(set_prefix=False)
+    phases.append(('django.setup', time.perf_counter() - started, None))
+
+    from django.core.handlers.wsgi import WSGIHandler
+
+    started = time.perf_counter()
+    WSGIHandler()
+    phases.append(('wsgi handler', time.perf_counter() - started, None))
+
+    for name, seconds, count in warm_up():
+        phases.append(('warm-up ' + name, seconds, count))
+    return phases
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hallaplantproject.settings')
+    json.dump(measure_startup(), sys.stdout)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hallaplantproject.settings')
 
 application = get_wsgi_application()
+
+# 요청을 받기 전에 url, template, markdown 등을 미리 준비한다 (settings.WARMUP_ON_STARTUP)
+from .warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup()
@@ -16,13 +16,20 @@
 #     )
 
 from blog.models import Post
+from blog.pagecache import PageCacheMixin
+from blog.conditional import ConditionalGetMixin
+from blog.invalidation import POSTS
 from django.views.generic.base import TemplateView
 
-class PreviewList(TemplateView):
+class PreviewList(ConditionalGetMixin, PageCacheMixin, TemplateView):
     template_name = "main/index.html"
+    use_replica = True
+
+    def get_cache_dependencies(self):
+        return [POSTS]
 
     def get_context_data(self, *, object_list=None, **kwargs): # context에 다른 객체들을 넣어 보낼수있다
         context = super(PreviewList, self).get_context_data(**kwargs)
-        context['post_preview'] = Post.objects.order_by('-created')[:3] # 카테고리 객체들
+        context['post_preview'] = Post.objects.order_by('-created', '-pk').defer('content', 'content_html')[:3] # 카테고리 객체들
 
         return context